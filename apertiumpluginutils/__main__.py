@@ -0,0 +1,289 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Translates files line by line from the command line
+
+Usage::
+
+	python -m apertiumpluginutils SOURCE TARGET [-i INPUT] [-o OUTPUT] [-a APY]... [-w WORKERS]
+
+Each line of the input (the standard input by default) is translated with :func:`apertiumpluginutils.apertiumInterfaceAPY.translate` and written to the output (the standard output by default) in the same order. Lines that cannot be translated are copied untouched and reported in the standard error.
+
+Only a bounded number of lines are kept in memory at any time, so files of any size can be translated. When the output is a file, the progress is saved every few lines to a checkpoint file (*OUTPUT.checkpoint* by default); running the same command again after an interruption resumes the job where it stopped.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+from . import apertiumFiles
+from . import apertiumInterfaceAPY
+
+def parseArguments(argv=None):
+	"""
+	Parses the command line arguments.
+
+    :param argv: List with the arguments. Defaults to the ones given to the program.
+    :returns: The parsed arguments.
+    """
+	parser = argparse.ArgumentParser(prog='python -m apertiumpluginutils', description='Translates a text line by line using an Apertium-APY.')
+	parser.add_argument('source', help='language to translate from')
+	parser.add_argument('target', help='language to translate to')
+	parser.add_argument('-i', '--input', help='file to translate (standard input by default)')
+	parser.add_argument('-o', '--output', help='file to write the translation to (standard output by default)')
+	parser.add_argument('-a', '--apy', action='append', help='address of an APY to use; can be given several times')
+	parser.add_argument('-w', '--workers', type=int, default=4, help='number of lines translated at the same time (default: 4)')
+	parser.add_argument('-c', '--checkpoint', help='file where the progress is saved (default: OUTPUT.checkpoint); needs --output')
+	parser.add_argument('--checkpoint-every', type=int, default=1000, help='number of lines between checkpoints (default: 1000)')
+	parser.add_argument('--progress', type=float, default=5, help='seconds between progress reports, 0 to disable (default: 5)')
+	parser.add_argument('--pivot', action='store_true', help='translate through intermediate languages when the pair is not available')
+	parser.add_argument('--filter', action='store_true', help='skip lines with nothing to translate and protect URLs, mentions and code')
+	parser.add_argument('--segment', action='store_true', help='cache translations sentence by sentence')
+
+	args = parser.parse_args(argv)
+
+	# The position in the standard output cannot be saved nor resumed from
+	if(args.checkpoint is not None and args.output is None):
+		parser.error('--checkpoint needs --output')
+
+	return args
+
+def readCheckpoint(fileName):
+	"""
+	Reads the progress saved by a previous run.
+
+    :param fileName: Name of the checkpoint file.
+    :type fileName: str
+    :returns: A dictionary with the number of input lines already translated (**'lines'**) and the size of the output at that point (**'offset'**). Both are 0 if there is no checkpoint.
+    """
+	if(fileName is None or not os.path.isfile(fileName)):
+		return {'lines':0, 'offset':0}
+
+	with open(fileName, 'r') as file1:
+		return json.load(file1)
+
+def writeCheckpoint(fileName, lines, offset):
+	"""
+	Saves the progress of the job, replacing the checkpoint file atomically.
+
+    :param fileName: Name of the checkpoint file.
+    :type fileName: str
+    :param lines: Number of input lines translated and written.
+    :type lines: int
+    :param offset: Size of the output after writing those lines.
+    :type offset: int
+    """
+	with open(fileName+'.tmp', 'w') as file1:
+		json.dump({'lines':lines, 'offset':offset}, file1)
+		file1.flush()
+		os.fsync(file1.fileno())
+
+	apertiumFiles.replaceFile(fileName+'.tmp', fileName)
+
+def translateLines(lines, output, translate, workers=4, skip=0, onWritten=None):
+	"""
+	Translates an iterable of lines with several worker threads, writing the results in order.
+
+    :param lines: Iterable with the lines to translate, as utf-8 encoded bytes.
+    :param output: Binary file-like object the translations are written to.
+    :param translate: Function receiving a line without its line break and returning the result of :func:`apertiumpluginutils.apertiumInterfaceAPY.translate`.
+    :param workers: Number of lines translated at the same time.
+    :type workers: int
+    :param skip: Number of lines at the beginning of *lines* to ignore.
+    :type skip: int
+    :param onWritten: Optional function called with the line number, the length of the line and the error message (None on success) after writing each line.
+    :returns: The number of lines that could not be translated.
+
+    .. note::
+
+       An exception raised by *translate* only makes its line fail: the line is copied untouched and reported like any other error.
+    """
+	pending = queue.Queue()
+	slots = threading.Semaphore(workers*4)
+	results = {}
+	ready = threading.Condition()
+	state = {'read':None, 'errors':0, 'exception':None}
+
+	def work():
+		while(True):
+			item = pending.get()
+			if(item is None):
+				return
+
+			number, line = item
+			body = line.rstrip(b'\r\n')
+			ending = line[len(body):]
+
+			if(body.strip() == b''):
+				result = {'ok':True, 'result':body}
+			else:
+				try:
+					result = translate(body)
+				except Exception as e:
+					result = {'ok':False, 'errorMsg':(type(e).__name__+': '+str(e)).encode('utf-8', 'replace')}
+
+				if(result is None):
+					result = {'ok':False, 'errorMsg':b'No APY available'}
+
+			with ready:
+				results[number] = (line, ending, result)
+				ready.notify_all()
+
+	def read():
+		count = 0
+		try:
+			for number,line in enumerate(lines):
+				count = number+1
+				if(number < skip):
+					continue
+				slots.acquire()
+				pending.put((number, line))
+		except Exception as e:
+			state['exception'] = e
+		finally:
+			with ready:
+				state['read'] = max(count, skip)
+				ready.notify_all()
+
+		for it in range(workers):
+			pending.put(None)
+
+	threads = [threading.Thread(target=work) for it in range(workers)]+[threading.Thread(target=read)]
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+
+	number = skip
+	while(True):
+		with ready:
+			while(number not in results and state['read'] != number):
+				ready.wait()
+
+			if(number not in results):
+				break
+			line, ending, result = results.pop(number)
+
+		slots.release()
+
+		if(result['ok']):
+			output.write(result['result']+ending)
+			error = None
+		else:
+			output.write(line)
+			error = result['errorMsg']
+			state['errors'] = state['errors']+1
+
+		if(onWritten is not None):
+			onWritten(number, len(line), error)
+		number = number+1
+
+	if(state['exception'] is not None):
+		raise state['exception']
+
+	return state['errors']
+
+def main(argv=None):
+	"""
+	Runs the command line tool.
+
+    :param argv: List with the arguments. Defaults to the ones given to the program.
+    :returns: The exit status: 0 if every line was translated, 1 otherwise.
+    """
+	args = parseArguments(argv)
+
+	apertiumInterfaceAPY.maxConcurrentRequests = max(apertiumInterfaceAPY.maxConcurrentRequests, args.workers)
+
+	if(args.apy):
+		apertiumInterfaceAPY.setAPYList(args.apy)
+
+	checkpoint = args.checkpoint
+	if(checkpoint is None and args.output is not None):
+		checkpoint = args.output+'.checkpoint'
+
+	progress = readCheckpoint(checkpoint)
+
+	if(args.output is None):
+		output = getattr(sys.stdout, 'buffer', sys.stdout)
+	elif(progress['lines'] > 0 and os.path.isfile(args.output)):
+		output = open(args.output, 'r+b')
+		output.truncate(progress['offset'])
+		output.seek(progress['offset'])
+	else:
+		progress = {'lines':0, 'offset':0}
+		output = open(args.output, 'wb')
+
+	if(args.input is None):
+		inputFile = getattr(sys.stdin, 'buffer', sys.stdin)
+	else:
+		inputFile = open(args.input, 'rb')
+
+	if(progress['lines'] > 0):
+		sys.stderr.write('Resuming after line '+str(progress['lines'])+'\n')
+
+	start = time.time()
+	stats = {'lines':0, 'bytes':0, 'report':start}
+
+	def translate(line):
+		return apertiumInterfaceAPY.translate(line, args.source, args.target, pivot=args.pivot, priority=apertiumInterfaceAPY.PRIORITY_BULK, prefilter=args.filter, segment=args.segment)
+
+	def onWritten(number, length, error):
+		stats['lines'] = stats['lines']+1
+		stats['bytes'] = stats['bytes']+length
+
+		if(error is not None):
+			sys.stderr.write('Line '+str(number+1)+': '+error.decode('utf-8')+'\n')
+
+		if(checkpoint is not None and (number+1) % args.checkpoint_every == 0):
+			output.flush()
+			writeCheckpoint(checkpoint, number+1, output.tell())
+
+		now = time.time()
+		if(args.progress > 0 and now-stats['report'] >= args.progress):
+			stats['report'] = now
+			elapsed = now-start
+			sys.stderr.write('%d lines, %.1f lines/s, %.1f KB/s\n' % (stats['lines'], stats['lines']/elapsed, stats['bytes']/elapsed/1024))
+
+	try:
+		errors = translateLines(inputFile, output, translate, args.workers, progress['lines'], onWritten)
+	finally:
+		output.flush()
+		if(args.output is not None):
+			output.close()
+		if(args.input is not None):
+			inputFile.close()
+
+	if(checkpoint is not None and os.path.isfile(checkpoint)):
+		os.remove(checkpoint)
+
+	elapsed = max(time.time()-start, 1e-6)
+	sys.stderr.write('%d lines translated in %.1f s (%.1f lines/s), %d errors\n' % (stats['lines'], elapsed, stats['lines']/elapsed, errors))
+
+	return 0 if errors == 0 else 1
+
+if __name__ == '__main__':
+	sys.exit(main())
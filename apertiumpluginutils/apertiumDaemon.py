@@ -0,0 +1,265 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Local daemon shared by the plugin processes of a host
+
+A host running many chat clients would otherwise keep one view of the APYs per process: its own pair catalogs, health checks, schedulers and caches, multiplying the load sent to the APYs. The daemon keeps a single copy of all of them and answers the plugins over a Unix domain socket, so the APYs see one client per host.
+
+The daemon speaks the same HTTP API as an APY (*/listPairs* and */translate*), backed by :mod:`apertiumpluginutils.apertiumInterfaceAPY`:
+
+- */listPairs* returns the union of the pairs offered by the APYs of the daemon, rebuilt at most every **catalogInterval** seconds and tagged with an *ETag*, so the plugins revalidate it without any request reaching the APYs.
+
+- */translate* is answered with :func:`apertiumpluginutils.apertiumInterfaceAPY.translate`, with pivot translations and, unless disabled, the segment cache. An extra *priority=bulk* parameter makes it a bulk request. When the APYs fail, the response is a *502* whose body also carries the **'errorType'** of the failure; the request has already been retried on the APYs, so the plugins do not retry it.
+
+- */status* returns the APY list, their health and the hits and misses of the segment cache.
+
+Plugins use it by setting :data:`apertiumpluginutils.apertiumInterfaceAPY.daemonAddress`. The daemon is meant to run in its own process::
+
+	python -m apertiumpluginutils.apertiumDaemon SOCKET [-a APY]... [--no-segment]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+
+try:
+	from http.server import BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn, UnixStreamServer
+	from urllib.parse import urlparse, parse_qs
+	from html import escape
+except ImportError:
+	from BaseHTTPServer import BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn, UnixStreamServer
+	from urlparse import urlparse, parse_qs
+	from cgi import escape
+
+from . import apertiumDecoding
+from . import apertiumInterfaceAPY
+
+catalogInterval = 30
+
+class DaemonHandler(BaseHTTPRequestHandler):
+	"""
+	Answers the requests made to a :class:`DaemonServer`.
+    """
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		query = parse_qs(url.query)
+
+		if(url.path == '/listPairs'):
+			etag, body = self.server.getCatalog()
+
+			if(etag is None):
+				self._send(502, {'responseData':None, 'responseDetails':'No APY available', 'responseStatus':502})
+			elif(self.headers.get('If-None-Match') == etag):
+				self.send_response(304)
+				self.send_header('ETag', etag)
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+			else:
+				self._send(200, body, etag)
+		elif(url.path == '/translate' and 'langpair' in query and '|' in query['langpair'][0]):
+			source, target = query['langpair'][0].split('|', 1)
+			priority = apertiumInterfaceAPY.PRIORITY_BULK if query.get('priority', [''])[0] == 'bulk' else apertiumInterfaceAPY.PRIORITY_INTERACTIVE
+
+			# Sending the request on would make it come back here
+			if(apertiumInterfaceAPY.daemonAddress is not None):
+				self._send(503, {'responseData':None, 'responseDetails':'The daemon process delegates to a daemon', 'responseStatus':503})
+				return
+
+			result = apertiumInterfaceAPY.translate(query.get('q', [''])[0], source, target, pivot=self.server.pivot, priority=priority, segment=self.server.segment)
+
+			if(result['ok']):
+				self._send(200, {'responseData':{'translatedText':escape(apertiumDecoding.toText(result['result']), False)}, 'responseDetails':None, 'responseStatus':200})
+			elif(result.get('errorType') is None):
+				self._send(400, {'responseData':None, 'responseDetails':apertiumDecoding.toText(result['errorMsg']), 'responseStatus':400})
+			else:
+				self._send(502, {'responseData':None, 'responseDetails':apertiumDecoding.toText(result['errorMsg']), 'errorType':result['errorType'], 'responseStatus':502})
+		elif(url.path == '/status'):
+			self._send(200, self.server.getStatus())
+		else:
+			self._send(404, {'responseData':None, 'responseDetails':'Not found', 'responseStatus':404})
+
+	def log_message(self, format, *args):
+		if(self.server.verbose):
+			BaseHTTPRequestHandler.log_message(self, format, *args)
+
+	def address_string(self):
+		return 'unix'
+
+	def _send(self, code, body, etag=None):
+		data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json; charset=UTF-8')
+		self.send_header('Content-Length', str(len(data)))
+		if(etag is not None):
+			self.send_header('ETag', etag)
+		self.end_headers()
+		self.wfile.write(data)
+
+class DaemonServer(ThreadingMixIn, UnixStreamServer):
+	"""
+	Daemon listening on a Unix domain socket.
+
+    :param path: Path of the socket. A socket left behind at that path by a previous daemon is replaced.
+    :type path: str
+    :param pivot: If True, translations of pairs not offered by any APY go through intermediate languages.
+    :type pivot: boolean
+    :param segment: If True, translations are cached sentence by sentence.
+    :type segment: boolean
+    :param verbose: If True, every request is logged to the standard error.
+    :type verbose: boolean
+    """
+
+	daemon_threads = True
+
+	def __init__(self, path, pivot=True, segment=True, verbose=False):
+		if(os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode)):
+			os.remove(path)
+
+		UnixStreamServer.__init__(self, path, DaemonHandler)
+		self.pivot = pivot
+		self.segment = segment
+		self.verbose = verbose
+		self.catalog = (None, None)
+		self.catalogTime = 0
+		self.catalogLock = threading.Lock()
+
+	def getCatalog(self):
+		"""
+		Retrieves the union of the pairs offered by the APYs, rebuilding it if it is older than **catalogInterval** seconds.
+
+	    :returns: A tuple with the *ETag* of the catalog and the body of the */listPairs* response. Both are None if no APY answered.
+	    """
+		with self.catalogLock:
+			if(self.catalog[0] is not None and time.time()-self.catalogTime < catalogInterval):
+				return self.catalog
+
+			pairs = []
+			seen = set()
+
+			for index in range(apertiumInterfaceAPY.getAPYListSize()):
+				result = apertiumInterfaceAPY.getAllPairs(index)
+
+				if(result['ok']):
+					for pair in result['result']:
+						pair = (apertiumDecoding.toText(pair[0]), apertiumDecoding.toText(pair[1]))
+						if(pair not in seen):
+							seen.add(pair)
+							pairs.append(pair)
+
+			if(len(seen) == 0):
+				return (None, None)
+
+			body = json.dumps({'responseData':[{'sourceLanguage':source, 'targetLanguage':target} for source,target in pairs], 'responseDetails':None, 'responseStatus':200}).encode('utf-8')
+			self.catalog = ('"'+hashlib.sha1(body).hexdigest()[:16]+'"', body)
+			self.catalogTime = time.time()
+
+			return self.catalog
+
+	def getStatus(self):
+		"""
+		Retrieves the state of the daemon.
+
+	    :returns: A dictionary with the APY list (**'apyList'**), the result of the last check made on each APY (**'health'**) and the hits and misses of the segment cache (**'segmentCache'**).
+	    """
+		addresses = list(apertiumInterfaceAPY.apyAddress)
+
+		return {'apyList':addresses, 'health':dict((address, apertiumInterfaceAPY.apyHealth.get(address)) for address in addresses), 'segmentCache':dict(apertiumInterfaceAPY.segmentCacheStats)}
+
+	def server_close(self):
+		UnixStreamServer.server_close(self)
+
+		if(os.path.exists(self.server_address)):
+			os.remove(self.server_address)
+
+def serve(path, addresses=None, segment=True, pivot=True, background=False, verbose=False):
+	"""
+	Starts a daemon.
+
+    The daemon uses the settings and state of :mod:`apertiumpluginutils.apertiumInterfaceAPY` in the current process, without changing any of them other than the APY list when addresses is given.
+
+    :param path: Path of the Unix domain socket to listen on.
+    :type path: str
+    :param addresses: List of APY addresses the daemon sends the requests to, set as the APY list of the process. Defaults to the current APY list.
+    :param segment: If True (default), translations are cached sentence by sentence.
+    :type segment: boolean
+    :param pivot: If True (default), translations of pairs not offered by any APY go through intermediate languages.
+    :type pivot: boolean
+    :param background: If True, the daemon runs in a background thread and the function returns immediately. Otherwise (default), it runs until interrupted.
+    :type background: boolean
+    :param verbose: If True, every request is logged to the standard error.
+    :type verbose: boolean
+    :returns: The :class:`DaemonServer`. Its address is *'unix://'+server.server_address*. Call its *shutdown* method to stop it.
+    :raises ValueError: If the process delegates its requests to a daemon itself (see :data:`apertiumpluginutils.apertiumInterfaceAPY.daemonAddress`).
+    """
+	if(apertiumInterfaceAPY.daemonAddress is not None):
+		raise ValueError('The daemon cannot run in a process that delegates to a daemon')
+
+	if(addresses is not None):
+		apertiumInterfaceAPY.setAPYList(addresses)
+
+	server = DaemonServer(path, pivot, segment, verbose)
+
+	if(background):
+		thread = threading.Thread(target=server.serve_forever)
+		thread.daemon = True
+		thread.start()
+	else:
+		try:
+			server.serve_forever()
+		finally:
+			server.server_close()
+
+	return server
+
+def main(argv=None):
+	"""
+	Runs a daemon from the command line.
+
+    :param argv: List with the arguments. Defaults to the ones given to the program.
+    """
+	parser = argparse.ArgumentParser(prog='python -m apertiumpluginutils.apertiumDaemon', description='Serves the APYs to every plugin process of the host through a Unix domain socket.')
+	parser.add_argument('socket', help='path of the Unix domain socket to listen on')
+	parser.add_argument('-a', '--apy', action='append', help='address of an APY to use; can be given several times')
+	parser.add_argument('-c', '--max-concurrent', type=int, help='maximum number of requests in progress per APY')
+	parser.add_argument('--no-segment', action='store_true', help='do not cache translations sentence by sentence')
+	parser.add_argument('--no-pivot', action='store_true', help='do not translate through intermediate languages')
+	parser.add_argument('-v', '--verbose', action='store_true', help='log every request to the standard error')
+	args = parser.parse_args(argv)
+
+	if(args.max_concurrent is not None):
+		apertiumInterfaceAPY.maxConcurrentRequests = args.max_concurrent
+
+	try:
+		serve(args.socket, args.apy, not args.no_segment, not args.no_pivot, verbose=args.verbose)
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,95 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Decodes the responses sent by an Apertium-APY
+
+The raw bytes of a response are handed directly to the JSON parser, without decoding them to a string first. If `orjson <https://pypi.org/project/orjson/>`_ or `ujson <https://pypi.org/project/ujson/>`_ are installed they are used instead of the standard :mod:`json` module.
+"""
+
+import sys
+
+try:
+	import orjson as jsonModule
+	jsonBackend = 'orjson'
+except ImportError:
+	try:
+		import ujson as jsonModule
+		jsonBackend = 'ujson'
+	except ImportError:
+		import json as jsonModule
+		jsonBackend = 'json'
+
+try:
+	from html import unescape
+except ImportError:
+	import HTMLParser
+	unescape = HTMLParser.HTMLParser().unescape
+
+pyVersion = sys.version_info[0]
+
+def loads(data):
+	"""
+	Parses the body of a response.
+
+    :param data: Raw body of the response.
+    :type data: bytes
+    :returns: The parsed JSON object.
+    :raises ValueError: If the body is not valid JSON.
+    """
+	if(pyVersion >= 3 and jsonBackend == 'json' and sys.version_info[1] < 6):
+		data = data.decode('utf-8')
+
+	return jsonModule.loads(data)
+
+def toText(value):
+	"""
+	Converts a parameter received by the interface functions to a string.
+
+    :param value: A string, or its utf-8 encoding.
+    :returns: The value as a string. Values that are not utf-8 bytes are returned untouched.
+    """
+	if(pyVersion >= 3 and isinstance(value, bytes)):
+		return value.decode('utf-8')
+
+	return value
+
+def toOutput(text, asText=False):
+	"""
+	Converts a string to the format the interface functions return.
+
+    :param text: String to be converted.
+    :type text: str
+    :param asText: If True, the string is returned as it is. Otherwise it is encoded in utf-8.
+    :type asText: boolean
+    :returns: The converted string.
+    """
+	if(asText):
+		return text
+
+	return text.encode('utf-8')
+
+def translatedText(jsonObj):
+	"""
+	Extracts the translated text from the parsed response to a */translate* request.
+
+    :param jsonObj: Parsed response.
+    :returns: A string with the translation.
+    """
+	return unescape(jsonObj['responseData']['translatedText']).replace('%20',' ')
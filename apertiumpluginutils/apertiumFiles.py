@@ -35,16 +35,21 @@ The structure for each *userN*:
 	**'source'** : *source_language_str*
 
 	**'target'** : *target_language_str*
+
+The dictionary is stored as a binary snapshot (see :mod:`apertiumpluginutils.apertiumSnapshot`). Files pickled by previous versions are converted the first time they are read, keeping a copy of the original with the *.bak* extension added.
 """
 
-import pickle
 import sys
+import os
 import os.path
+from . import apertiumSnapshot
 
 dictionary = None
 
 fileName = 'apertium_plugin_pairs_preferences.pkl'
 
+warmUpOnRead = True
+
 def setFile(newFileName):
 	"""
 	Sets the name for the file where the dictionary will be stored.
@@ -68,10 +73,7 @@ def createDictionary():
 
 	dictionary = {'version':sys.version_info[0], 'apyAddress':['http://localhost:2737'.encode('utf-8')], 'incoming':{}, 'outgoing':{}}
 
-	file1 = open(fileName, 'wb')
-
-	pickle.dump(dictionary, file1)
-	file1.close()
+	save()
 
 def read():
 	"""
@@ -81,7 +83,13 @@ def read():
 
        If the file to store the dictionary in does not exist, a new file and a dictionary are created with :func:`createDictionary`.
 
+    .. note::
+
+       If **warmUpOnRead** is True (default), the language pairs bound to the users are warmed up in the background with :func:`warmUp`.
+
     :returns: The dictionary.
+    :raises ValueError: If the file is neither a valid snapshot nor a valid pickle file.
+    :raises TypeError: If the file is a pickle holding a value that cannot be stored in a snapshot. The file is left untouched.
     """
 	global dictionary
 
@@ -90,21 +98,36 @@ def read():
 
 	file1 = open(fileName, 'rb')
 
-	dictionary = pickle.load(file1)
+	data = file1.read()
 	file1.close()
 
+	if(apertiumSnapshot.isSnapshot(data)):
+		dictionary = apertiumSnapshot.loads(data)
+	else:
+		dictionary = apertiumSnapshot.loadPickle(data)
+		snapshot = apertiumSnapshot.dumps(dictionary)
+
+		# The original only gets replaced once its copy and the snapshot are ready
+		if(not os.path.exists(fileName+'.bak')):
+			_write(fileName+'.bak', data)
+		_write(fileName, snapshot)
+
+	if(warmUpOnRead):
+		warmUp()
+
 	return dictionary
 
 def save():
 	"""
 	Saves the current state of the dictionary to a file.
+
+    The new contents are written to a temporary file that then replaces the old one, atomically where the platform allows it, so the file is never left half written.
+
+    :raises TypeError: If the dictionary holds a value that cannot be stored in a snapshot.
     """
 	global dictionary
 
-	file1 = open(fileName, 'wb')
-
-	pickle.dump(dictionary, file1)
-	file1.close()
+	_write(fileName, apertiumSnapshot.dumps(dictionary))
 
 def getKey(key):
 	"""
@@ -210,3 +233,61 @@ def setDictionary(newDictionary):
 	global dictionary
 
 	dictionary = newDictionary
+
+def getBindingPairs():
+	"""
+	Retrieves the distinct language pairs bound to users in either direction.
+
+    :returns: A list of tuples with the source and target languages of each pair, ordered from the most to the least bound pair.
+    """
+	global dictionary
+
+	if(dictionary is None):
+		read()
+
+	counts = {}
+
+	for direction in ['incoming', 'outgoing']:
+		for binding in dictionary.get(direction, {}).values():
+			pair = (binding['source'], binding['target'])
+			counts[pair] = counts.get(pair, 0)+1
+
+	return sorted(counts, key=lambda pair: -counts[pair])
+
+def warmUp():
+	"""
+	Makes the APYs start the pipelines of the language pairs bound to users, so that the first messages translated with them do not have to wait.
+
+    The pairs are handed to :func:`apertiumpluginutils.apertiumInterfaceAPY.setWarmUpPairs`, so they are also warmed up on any APY added later, and sent in the background with :func:`apertiumpluginutils.apertiumInterfaceAPY.warmUp`.
+    """
+	from . import apertiumInterfaceAPY
+
+	pairs = getBindingPairs()
+
+	apertiumInterfaceAPY.setWarmUpPairs(pairs)
+	if(len(pairs) > 0):
+		apertiumInterfaceAPY.warmUp()
+
+def replaceFile(source, destination):
+	"""
+	Renames a file, replacing the destination if it exists, atomically where the platform allows it.
+
+    :param source: Name of the file to rename.
+    :type source: str
+    :param destination: New name of the file.
+    :type destination: str
+    """
+	if(hasattr(os, 'replace')):
+		os.replace(source, destination)
+	else:
+		if(sys.platform.startswith('win') and os.path.exists(destination)):
+			os.remove(destination)
+		os.rename(source, destination)
+
+def _write(name, data):
+	file1 = open(name+'.tmp', 'wb')
+
+	file1.write(data)
+	file1.close()
+
+	replaceFile(name+'.tmp', name)
@@ -0,0 +1,152 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Filters the texts before they are sent to an Apertium-APY
+
+Many chat messages have nothing to translate: links, numbers, emoticons, nicknames... This module decides which texts can be returned untouched without asking an APY, and hides the parts of the rest that must not be translated.
+
+- **skipRules** : List of functions receiving the text (with the protected spans removed) and returning True if it does not need to be translated. By default, texts without any letter are skipped.
+
+- **protectedPatterns** : List of compiled regular expressions. The spans matching them are replaced by a placeholder before the translation and put back afterwards. By default, these are URLs, e-mail addresses, mentions (*@nick*), emoticons and code between backquotes.
+
+Both lists can be modified with :func:`addSkipRule` and :func:`addProtectedPattern`.
+"""
+
+import re
+import threading
+
+placeholderPattern = re.compile(r'[*#@]?9157(\d{4})7519')
+
+skipRules = [lambda text: re.search(r'[^\W\d_]', text, re.UNICODE) is None]
+
+protectedPatterns = [
+	re.compile(r'```.*?```|`[^`\n]+`', re.DOTALL),
+	re.compile(r'\b(?:https?|ftp)://[^\s<>"]+|\bwww\.[^\s<>"]+', re.UNICODE),
+	re.compile(r'\b[\w.+-]+@[\w-]+\.[\w.-]+\b', re.UNICODE),
+	re.compile(r'(?<!\w)@\w+', re.UNICODE),
+	re.compile(r'(?<!\S)[:;=8xX][-\'^]?[()\[\]DPpOo3/\\|*]+(?!\S)')
+]
+
+stats = {'checked':0, 'skipped':0, 'masked':0}
+
+statsLock = threading.Lock()
+
+def addSkipRule(rule):
+	"""
+	Adds a new rule deciding which texts are not sent to the APY.
+
+    :param rule: Function receiving a string and returning True if the string does not need to be translated.
+    """
+	skipRules.append(rule)
+
+def addProtectedPattern(pattern, flags=re.UNICODE):
+	"""
+	Adds a new kind of span to be kept out of the translation.
+
+    :param pattern: Regular expression matching the spans, either as a string or already compiled.
+    :param flags: Flags used to compile the pattern if it is a string.
+    :type flags: int
+    """
+	if(not hasattr(pattern, 'finditer')):
+		pattern = re.compile(pattern, flags)
+
+	protectedPatterns.append(pattern)
+
+def prepare(text):
+	"""
+	Prepares a text to be sent to the APY.
+
+    :param text: String to be translated.
+    :type text: str
+    :returns: None if the text does not need to be translated. Otherwise, a tuple with the text to be sent to the APY, where the protected spans have been replaced by placeholders, and the list of those spans, to be passed to :func:`restore`.
+    """
+	spans = []
+
+	if(placeholderPattern.search(text) is None):
+		for pattern in protectedPatterns:
+			text = pattern.sub(lambda match: _mask(match, spans), text)
+
+	bare = placeholderPattern.sub(' ', text)
+	skip = False
+
+	for rule in skipRules:
+		if(rule(bare)):
+			skip = True
+			break
+
+	with statsLock:
+		stats['checked'] = stats['checked']+1
+		if(skip):
+			stats['skipped'] = stats['skipped']+1
+		elif(len(spans) > 0):
+			stats['masked'] = stats['masked']+1
+
+	if(skip):
+		return None
+
+	return (text, spans)
+
+def restore(text, spans):
+	"""
+	Puts the protected spans back into a translated text.
+
+    :param text: Translation of the text returned by :func:`prepare`.
+    :type text: str
+    :param spans: List of spans returned by :func:`prepare`.
+    :returns: The translated text with the original spans.
+    """
+	if(len(spans) == 0):
+		return text
+
+	return placeholderPattern.sub(lambda match: spans[int(match.group(1))] if int(match.group(1)) < len(spans) else match.group(0), text)
+
+def getStats():
+	"""
+	Retrieves how many texts went through the filter.
+
+    :returns: A dictionary.
+
+    	The dictionary has the following fields:
+
+    	- **'checked'**: Number of texts checked
+
+    	- **'skipped'**: Number of texts returned without being sent to the APY, that is, the number of translation requests saved
+
+    	- **'masked'**: Number of texts sent to the APY with some span protected
+    """
+	with statsLock:
+		return dict(stats)
+
+def resetStats():
+	"""
+	Sets all the counters returned by :func:`getStats` back to 0.
+    """
+	with statsLock:
+		for key in stats:
+			stats[key] = 0
+
+def _mask(match, spans):
+	# Indexes have a fixed width so that adjacent placeholders, or a placeholder next to other digits, cannot be read as a single one
+	if(len(spans) >= 10000):
+		return match.group(0)
+
+	spans.append(match.group(0))
+
+	return '9157%04d7519' % (len(spans)-1)
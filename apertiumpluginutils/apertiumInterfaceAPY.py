@@ -19,6 +19,30 @@
 
 """
 :Synopsis: Acts as an interface with an Apertium-APY
+
+Strings returned by the functions in this module are utf-8 encoded. Setting **textResults** to True makes them return str objects instead, saving the encoding step when the caller has no use for bytes. Responses are decoded by :mod:`apertiumpluginutils.apertiumDecoding`.
+
+Every request asks for a gzip compressed response. The list of pairs offered by each APY is kept in **pairCatalogs** and revalidated with *If-None-Match*/*If-Modified-Since* headers, so an unchanged catalog costs a *304* response and no parsing. When the APY sends neither an *ETag* nor a *Last-Modified* header, a hash of the response is compared with the previous one instead.
+
+The result of the last check made on each APY is kept in **apyHealth**. Addresses set with *force* are checked by a background thread, so registering them never waits for the APYs to answer.
+
+The request functions accept a *deadline* covering the whole call. The time left is split evenly among the addresses still to be tried, and if **adaptiveTimeouts** is True, each request is further limited by the timeout learnt for its APY (see :func:`getAdaptiveTimeout`).
+
+Requests go through a per-APY scheduler (see :func:`getScheduler` and :mod:`apertiumpluginutils.apertiumScheduler`) that limits their concurrency and rate. When the queue of an APY is full, the request is dropped and the call returns the error *'Too many requests queued for APY'*.
+
+By default, :func:`translate` tries the APYs in the order of the list. Setting **routingMode** to *'affinity'* makes it pick them by consistent hashing of the language pair instead, among the healthy APYs offering the pair, so that each pair keeps being translated by the same few APYs and their pipelines stay warm. An APY whose load (see :meth:`apertiumpluginutils.apertiumScheduler.AddressScheduler.getLoad`) goes over **affinityLoadFactor** times the average is skipped in favour of the next one in the ring.
+
+Errors coming from a request to an APY carry an **'errorType'** field besides **'errorMsg'**: one of **ERROR_REFUSED**, **ERROR_CONNECTION**, **ERROR_TIMEOUT**, **ERROR_SERVER** (5xx responses), **ERROR_CLIENT** (4xx responses), **ERROR_MALFORMED** (invalid JSON or gzip data) or **ERROR_BUSY** (dropped by the scheduler). Requests failing with one of the types in **retryOn** are sent again to the same APY, up to **retryAttempts** times, after a random delay of up to **retryBackoff** seconds doubled on each retry (never more than **retryMaxBackoff**), as long as the timeout of the request allows it. All the requests sent to an APY are idempotent, so retrying them is safe. To keep retries from piling up on a struggling APY, each request adds **retryBudgetRatio** retries to a shared budget (capped to **retryBudgetMax**) and each retry spends one; no retries are made while the budget is empty.
+
+The dictionaries returned by the functions in this module are :class:`apertiumpluginutils.apertiumResult.Result` objects: they can be read as dictionaries, but not modified. This lets the same error and the same list of pairs be handed to every caller without building them again.
+
+Translations of single sentences made with *segment* are kept in **segmentCache**, which holds up to **segmentCacheSize** entries and drops the least recently used ones first. **segmentCacheStats** counts its hits and misses.
+
+Addresses of the form *unix:///path/to/socket* reach an APY running on the same host through a Unix domain socket instead of TCP. Their connections are kept alive and reused, up to **unixPoolSize** idle connections per address.
+
+Several plugin processes on the same host can share a single daemon (see :mod:`apertiumpluginutils.apertiumDaemon`) that owns the pair catalogs, the health of the APYs and the translation cache. Setting **daemonAddress** to its address (*unix:///path/to/socket*) sends every request without an explicit *index* to the daemon instead of the APY list. The daemon already retries the requests on its APYs, so requests to it are never retried. The APY list is used after it only while it cannot be reached (**ERROR_REFUSED** or **ERROR_CONNECTION**); any other error of the daemon, and a pair it does not offer, is returned as it is.
+
+If **recorder** is set to a function, it is called with a dictionary describing every call to :func:`translate` and to the pair query functions (see :mod:`apertiumpluginutils.apertiumRecorder`).
 """
 
 try:
@@ -30,45 +54,242 @@ try:
 except:
 	import urllib2
 try:
-    import html.parser as HTMLParser
+	import http.client as httplib
 except:
-	import HTMLParser
+	import httplib
 import sys
-import json
+import collections
+import errno
+import random
+import re
 import socket
+import threading
+import time
+import zlib
+import hashlib
+import bisect
+from . import apertiumDecoding
+from . import apertiumFilter
+from . import apertiumResult
+from . import apertiumScheduler
+from .apertiumScheduler import PRIORITY_INTERACTIVE, PRIORITY_BULK
 
 timeout = 8
 
+minTimeout = 0.5
+
+adaptiveTimeouts = False
+
+adaptiveSizeUnit = 500
+
+validationTimeout = 3
+
+adaptivePercentile = 0.99
+
+adaptiveFactor = 3
+
+latencySamples = 100
+
+maxConcurrentRequests = 4
+
+requestRate = None
+
+requestBurst = 4
+
+maxQueuedRequests = 32
+
+routingMode = 'failover'
+
+affinityReplicas = 64
+
+affinityLoadFactor = 1.25
+
+ERROR_REFUSED = 'refused'
+
+ERROR_CONNECTION = 'connection'
+
+ERROR_TIMEOUT = 'timeout'
+
+ERROR_SERVER = 'server'
+
+ERROR_CLIENT = 'client'
+
+ERROR_MALFORMED = 'malformed'
+
+ERROR_BUSY = 'busy'
+
+retryOn = frozenset([ERROR_CONNECTION, ERROR_TIMEOUT, ERROR_SERVER, ERROR_MALFORMED])
+
+retryAttempts = 2
+
+retryBackoff = 0.1
+
+retryMaxBackoff = 2.0
+
+retryBudgetRatio = 0.1
+
+retryBudgetMax = 10
+
+minLatencySamples = 10
+
+unixPoolSize = 8
+
+daemonAddress = None
+
 pyVersion = sys.version_info[0]
 
 apyAddress = ['http://localhost:2737']
 
-parser = HTMLParser.HTMLParser()
+textResults = False
+
+filterText = False
+
+segmentText = False
+
+segmentCacheSize = 10000
+
+warmUpText = 'ok'
+
+recorder = None
+
+maxPivotHops = 3
+
+latencySmoothing = 0.3
+
+pairGraph = None
+
+pairGraphKey = None
+
+pivotPaths = {}
+
+pairLatency = {}
+
+pairCatalogs = {}
+
+catalogVersion = 0
+
+apyHealth = {}
 
-def checkAPY(address):
+addressLatency = {}
+
+schedulers = {}
+
+schedulersLock = threading.Lock()
+
+affinityRings = {}
+
+retryTokens = retryBudgetMax
+
+retryLock = threading.Lock()
+
+segmentCache = collections.OrderedDict()
+
+segmentCacheStats = {'hits':0, 'misses':0}
+
+segmentLock = threading.Lock()
+
+warmUpPairs = []
+
+unixConnections = {}
+
+unixConnectionsLock = threading.Lock()
+
+segmentPattern = re.compile(u'((?<=[.!?\u2026])[ \t]+|[ \t]*\n\s*)', re.UNICODE)
+
+def checkAPY(address, timeout=None):
 	"""
 	Checks whether an APY server is running in the given address or not.
 
     :param address: Address to be checked.
     :type address: str
+    :param timeout: Seconds to wait for an answer. Defaults to **validationTimeout**.
+    :type timeout: float
     :returns: True if there was a response from the server, False otherwise.
     """
-	if(pyVersion >= 3):
-		try:
-			address.decode('utf-8')
-		except:
-			pass
+	address = apertiumDecoding.toText(address)
+
+	if(timeout is None):
+		timeout = validationTimeout
 
 	try:
-		request = urllib2.urlopen(address+'/listPairs')
-	except urllib2.URLError:
-		return False
-	except urllib2.HTTPError:
-		return False
+		result = _fetchCatalog(address, timeout)
 	except ValueError:
-		return False
+		result = {'ok':False}
+
+	apyHealth[address] = result['ok']
+
+	return result['ok']
+
+def checkAPYList(addresses, deadline=None):
+	"""
+	Checks several APY servers at the same time.
+
+    :param addresses: List with the addresses to be checked.
+    :param deadline: Maximum number of seconds to wait for all the checks to finish. Defaults to **validationTimeout**.
+    :type deadline: float
+    :returns: A list with one boolean per address, True if there was a response from the server before the deadline, False otherwise.
+    """
+	if(deadline is None):
+		deadline = validationTimeout
+
+	results = [False]*len(addresses)
+
+	def check(it, address):
+		results[it] = checkAPY(address, deadline)
+
+	threads = [threading.Thread(target=check, args=(it, address)) for it,address in enumerate(addresses)]
+	end = time.time()+deadline
 
-	return True
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+	for thread in threads:
+		thread.join(max(0, end-time.time()))
+
+	return list(results)
+
+def getAdaptiveTimeout(address, path='/listPairs'):
+	"""
+	Retrieves the timeout used for a single request to an APY.
+
+    Unless **adaptiveTimeouts** is True, this is always **timeout**. Otherwise, latencies are learnt separately for pair catalogs and for translations, and translations are further grouped by the length of the request, in classes doubling from **adaptiveSizeUnit** characters, so that the timeout of a long text is never learnt from short ones. Once enough answers of the same kind and class have been observed, the timeout is derived from the **adaptivePercentile** of their latencies multiplied by **adaptiveFactor**, and kept between **minTimeout** and **timeout**. Until then, **timeout** is used.
+
+    :param address: Address of the APY.
+    :type address: str
+    :param path: Path of the request, such as */listPairs* (default) or */translate?q=...*.
+    :type path: str
+    :returns: The timeout in seconds.
+    """
+	if(not adaptiveTimeouts):
+		return timeout
+
+	samples = addressLatency.get((apertiumDecoding.toText(address), _requestKind(path)))
+
+	if(samples is None or len(samples) < minLatencySamples):
+		return timeout
+
+	samples = sorted(samples)
+	percentile = samples[min(len(samples)-1, int(adaptivePercentile*len(samples)))]
+
+	return max(minTimeout, min(timeout, percentile*adaptiveFactor))
+
+def getScheduler(address):
+	"""
+	Retrieves the scheduler deciding when requests are sent to an APY.
+
+    The scheduler is created the first time it is needed, using the values of **maxConcurrentRequests**, **requestRate**, **requestBurst** and **maxQueuedRequests** at that moment.
+
+    :param address: Address of the APY.
+    :type address: str
+    :returns: The :class:`apertiumpluginutils.apertiumScheduler.AddressScheduler` for the address.
+    """
+	address = apertiumDecoding.toText(address)
+
+	with schedulersLock:
+		if(address not in schedulers):
+			schedulers[address] = apertiumScheduler.AddressScheduler(maxConcurrentRequests, requestRate, requestBurst, maxQueuedRequests)
+
+		return schedulers[address]
 
 def getAPYListSize():
 	"""
@@ -89,10 +310,7 @@ def getAPYAddress(index=0):
 	if(len(apyAddress) <= index or index < 0):
 		return None
 	else:
-		if(pyVersion >= 3):
-			return apyAddress[index].encode('utf-8')
-		else:
-			return apyAddress[index]
+		return _output(apyAddress[index])
 
 def setAPYAddress(newAddress, newPort=None, order=None, force=False):
 	"""
@@ -102,32 +320,29 @@ def setAPYAddress(newAddress, newPort=None, order=None, force=False):
     :type newAddress: str
     :param order: Position this address will take in the list. None (appends address) by default.
     :type order: int
-    :param force: Forces the address to be set even if there was no response.
+    :param force: Forces the address to be set without waiting for a response. The address is then checked in the background.
     :type force: boolean
     :returns: The new address list if it was changed, or None otherwise.
     """
 	global apyAddress
 
-	if(pyVersion >= 3):
-		try:
-			newAddress = newAddress.decode('utf-8')
-		except:
-			pass
-		if(newPort is not None):
-			try:
-				newPort = newPort.decode('utf-8')
-			except:
-				pass
+	newAddress = apertiumDecoding.toText(newAddress)
 
 	if(newPort is not None):
-		newAddress = newAddress+':'+newPort
+		newAddress = newAddress+':'+apertiumDecoding.toText(newPort)
+
+	if(force):
+		_checkInBackground([newAddress])
 
-	if(checkAPY(newAddress) or force):
+	if(force or checkAPY(newAddress)):
 		if(order == None):
 			apyAddress.append(newAddress)
 		else:
 			apyAddress.insert(order, newAddress)
 
+		if(len(warmUpPairs) > 0):
+			warmUp(addresses=[newAddress])
+
 		return getAPYList()
 	else:
 		return None
@@ -154,40 +369,44 @@ def getAPYList():
 
     :returns: The list of APY addresses.
     """
-	addrList = []
-
-	for address in apyAddress:
-		if(pyVersion >= 3):
-			addrList.append(address.encode('utf-8'))
-		else:
-			addrList.append(address)
-
-	return addrList
+	return [_output(address) for address in apyAddress]
 
-def setAPYList(newList):
+def setAPYList(newList, force=True, deadline=None):
 	"""
 	Sets a list of APY addresses as the address list.
 
     :param newList: List containing the addresses to be added.
+    :param force: Adds every address without waiting for a response. The addresses are then checked in the background. Defaults to True.
+    :type force: boolean
+    :param deadline: If force is False, maximum number of seconds to wait for the addresses to be checked (see :func:`checkAPYList`).
+    :type deadline: float
     :returns: The actual number of APY addresses added.
     """
 	global apyAddress
 
-	apyAddress = []
-	success = 0
+	newList = [apertiumDecoding.toText(address) for address in newList]
+
+	if(force):
+		valid = [True]*len(newList)
+		_checkInBackground(newList)
+	else:
+		valid = checkAPYList(newList, deadline)
 
-	for address in newList:
-		if(setAPYAddress(address, force=True) != None):
-			success = success+1
+	apyAddress = [address for address,ok in zip(newList, valid) if ok]
 
-	return success
+	if(len(warmUpPairs) > 0):
+		warmUp()
 
-def getAllPairs(index=-1):
+	return len(apyAddress)
+
+def getAllPairs(index=-1, deadline=None):
 	"""
 	Retrieves a list with all the available language pairs.
 
     :param index: Optional integer indicating the position of the address in the list the request should be sent to. Defaults to -1. Used to keep the function from iterating through all the addresses.
     :type index: int
+    :param deadline: Optional maximum number of seconds the whole call may take, failover to other addresses included. None (no deadline) by default.
+    :type deadline: float
     :returns: A dictionary.
 
     	The dictionary has the following fields:
@@ -200,55 +419,19 @@ def getAllPairs(index=-1):
 
     .. note::
 
-       Each element of the result list is a list with two string elements: the source and the target languages of the pair, respectively.
+       The result is a tuple. Each of its elements is a tuple with two string elements: the source and the target languages of the pair, respectively. The same tuple is returned to every caller until the catalog of the APY changes, so it can be kept without copying it.
     """
-	if(index > -1 and index < len(apyAddress)):
-		apyList = [apyAddress[index]]
-		last = 0
-	else:
-		apyList = apyAddress
-		last = len(apyAddress)-1
-
-	for it,address in enumerate(apyList):
-		pairs = []
-
-		try:
-			request = urllib2.urlopen(address+'/listPairs', timeout=timeout)
-		except urllib2.URLError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except urllib2.HTTPError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except socket.timeout:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Request timed out'.encode('utf-8')}
-			else:
-				continue
+	start = time.time()
+	result = _catalogAny(_selectAPYs(index), _deadlineEnd(deadline))
 
-		if(request.getcode() < 300):
-			if(pyVersion >= 3):
-				request = request.read().decode("utf-8")
-				jsonObj = json.loads(request)
-			else:
-				jsonObj = json.load(request)
-
-			for pair in jsonObj['responseData']:
-				pairs.append([ pair['sourceLanguage'].encode("utf-8"), pair['targetLanguage'].encode("utf-8") ])
+	if(result is not None and result['ok']):
+		result = apertiumResult.success(_outputPairs(result['result'], None, None))
 
-			return {'ok':True, 'result':pairs}
+	_record('getAllPairs', start, result)
 
-		else:
-			if(it == last):
-				return {'ok':False, 'errorMsg':('Response '+str(request.getcode())+' from APY').encode('utf-8')}
-			else:
-				continue
+	return result
 
-def getPairsBySource(source, index=-1):
+def getPairsBySource(source, index=-1, deadline=None):
 	"""
 	Retrieves a list with all the available language pairs that share a common source language.
 
@@ -256,6 +439,8 @@ def getPairsBySource(source, index=-1):
     :type source: str
     :param index: Optional integer indicating the position of the address in the list the request should be sent to. Defaults to -1. Used to keep the function from iterating through all the addresses.
     :type index: int
+    :param deadline: Optional maximum number of seconds the whole call may take, failover to other addresses included. None (no deadline) by default.
+    :type deadline: float
     :returns: A dictionary.
 
     	The dictionary has the following fields:
@@ -268,62 +453,21 @@ def getPairsBySource(source, index=-1):
 
     .. note::
 
-       Each element of the result list is a list with two string elements: the source and the target languages of the pair, respectively.
+       The result is a tuple. Each of its elements is a tuple with two string elements: the source and the target languages of the pair, respectively. The same tuple is returned to every caller until the catalog of the APY changes, so it can be kept without copying it.
     """
-	if(index > -1 and index < len(apyAddress)):
-		apyList = [apyAddress[index]]
-		last = 0
-	else:
-		apyList = apyAddress
-		last = len(apyAddress)-1
-
-	for it,address in enumerate(apyList):
-		pairs = []
-
-		if(pyVersion >= 3):
-			try:
-				source = source.decode("utf-8")
-			except:
-				pass
+	source = apertiumDecoding.toText(source)
 
-		try:
-			request = urllib2.urlopen(address+'/listPairs', timeout=timeout)
-		except urllib2.URLError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except urllib2.HTTPError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except socket.timeout:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Request timed out'.encode('utf-8')}
-			else:
-				continue
+	start = time.time()
+	result = _catalogAny(_selectAPYs(index), _deadlineEnd(deadline))
 
-		if(request.getcode() < 300):
-			if(pyVersion >= 3):
-				request = request.read().decode("utf-8")
-				jsonObj = json.loads(request)
-			else:
-				jsonObj = json.load(request)
+	if(result is not None and result['ok']):
+		result = apertiumResult.success(_outputPairs(result['result'], source, None))
 
-			for pair in jsonObj['responseData']:
-				if(pair['sourceLanguage'] == source):
-					pairs.append([ pair['sourceLanguage'].encode("utf-8"), pair['targetLanguage'].encode("utf-8") ])
+	_record('getPairsBySource', start, result, source=source)
 
-			return {'ok':True, 'result':pairs}
+	return result
 
-		else:
-			if(it == last):
-				return {'ok':False, 'errorMsg':('Response '+str(request.getcode())+' from APY').encode('utf-8')}
-			else:
-				continue
-
-def getPairsByTarget(target, index=-1):
+def getPairsByTarget(target, index=-1, deadline=None):
 	"""
 	Retrieves a list with all the available language pairs that share a common source language.
 
@@ -331,6 +475,8 @@ def getPairsByTarget(target, index=-1):
     :type target: str
     :param index: Optional integer indicating the position of the address in the list the request should be sent to. Defaults to -1. Used to keep the function from iterating through all the addresses.
     :type index: int
+    :param deadline: Optional maximum number of seconds the whole call may take, failover to other addresses included. None (no deadline) by default.
+    :type deadline: float
     :returns: A dictionary.
 
     	The dictionary has the following fields:
@@ -343,62 +489,21 @@ def getPairsByTarget(target, index=-1):
 
     .. note::
 
-       Each element of the result list is a list with two string elements: the source and the target languages of the pair, respectively.
+       The result is a tuple. Each of its elements is a tuple with two string elements: the source and the target languages of the pair, respectively. The same tuple is returned to every caller until the catalog of the APY changes, so it can be kept without copying it.
     """
-	if(index > -1 and index < len(apyAddress)):
-		apyList = [apyAddress[index]]
-		last = 0
-	else:
-		apyList = apyAddress
-		last = len(apyAddress)-1
-
-	for it,address in enumerate(apyList):
-		pairs = []
-
-		if(pyVersion >= 3):
-			try:
-				target = target.decode("utf-8")
-			except:
-				pass
-
-		try:
-			request = urllib2.urlopen(address+'/listPairs', timeout=timeout)
-		except urllib2.URLError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except urllib2.HTTPError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except socket.timeout:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Request timed out'.encode('utf-8')}
-			else:
-				continue
+	target = apertiumDecoding.toText(target)
 
-		if(request.getcode() < 300):
-			if(pyVersion >= 3):
-				request = request.read().decode("utf-8")
-				jsonObj = json.loads(request)
-			else:
-				jsonObj = json.load(request)
+	start = time.time()
+	result = _catalogAny(_selectAPYs(index), _deadlineEnd(deadline))
 
-			for pair in jsonObj['responseData']:
-				if(pair['targetLanguage'] == target):
-					pairs.append([ pair['sourceLanguage'].encode("utf-8"), pair['targetLanguage'].encode("utf-8") ])
+	if(result is not None and result['ok']):
+		result = apertiumResult.success(_outputPairs(result['result'], None, target))
 
-			return {'ok':True, 'result':pairs}
+	_record('getPairsByTarget', start, result, target=target)
 
-		else:
-			if(it == last):
-				return {'ok':False, 'errorMsg':('Response '+str(request.getcode())+' from APY').encode('utf-8')}
-			else:
-				continue
+	return result
 
-def pairExists(source, target, index=-1):
+def pairExists(source, target, index=-1, deadline=None):
 	"""
 	Checks if a given language pair is available.
 
@@ -408,6 +513,8 @@ def pairExists(source, target, index=-1):
     :type target: str
     :param index: Optional integer indicating the position of the address in the list the request should be sent to. Defaults to -1. Used to keep the function from iterating through all the addresses.
     :type index: int
+    :param deadline: Optional maximum number of seconds the whole call may take, failover to other addresses included. None (no deadline) by default.
+    :type deadline: float
     :returns: A dictionary.
 
     	The dictionary has the following fields:
@@ -418,67 +525,17 @@ def pairExists(source, target, index=-1):
 
     	- **'result':** True if the pair exists, False otherwise. Only present if **'ok'** is True
     """
-	if(index > -1 and index < len(apyAddress)):
-		apyList = [apyAddress[index]]
-		last = 0
-	else:
-		apyList = apyAddress
-		last = len(apyAddress)-1
-
-	for it,address in enumerate(apyList):
-		pairs = []
-
-		if(pyVersion >= 3):
-			try:
-				source = source.decode('utf-8')
-			except:
-				pass
-			try:
-				target = target.decode('utf-8')
-			except:
-				pass
-
-		try:
-			request = urllib2.urlopen(address+'/listPairs', timeout=timeout)
-		except urllib2.URLError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except urllib2.HTTPError:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-			else:
-				continue
-		except socket.timeout:
-			if(it == last):
-				return {'ok':False, 'errorMsg':'Request timed out'.encode('utf-8')}
-			else:
-				continue
+	source = apertiumDecoding.toText(source)
+	target = apertiumDecoding.toText(target)
 
-		if(request.getcode() < 300):
-			if(pyVersion >= 3):
-				request = request.read().decode("utf-8")
-				jsonObj = json.loads(request)
-			else:
-				jsonObj = json.load(request)
+	start = time.time()
+	result = _pairExists(source, target, _selectAPYs(index), _deadlineEnd(deadline))
 
-			for pair in jsonObj['responseData']:
-				if(pair['sourceLanguage'] == source and pair['targetLanguage'] == target):
-					return {'ok':True, 'result':True}
+	_record('pairExists', start, result, source, target)
 
-			if(it == last):
-				return {'ok':True, 'result':False}
-			else:
-				continue
-
-		else:
-			if(it == last):
-				return {'ok':False, 'errorMsg':('Response '+str(request.getcode())+' from APY').encode('utf-8')}
-			else:
-				continue
+	return result
 
-def translate(text, source, target, index=-1):
+def translate(text, source, target, index=-1, pivot=False, deadline=None, priority=PRIORITY_INTERACTIVE, prefilter=None, segment=None):
 	"""
 	Translates a given text.
 
@@ -490,6 +547,16 @@ def translate(text, source, target, index=-1):
     :type target: str
     :param index: Optional integer indicating the position of the address in the list the request should be sent to. Defaults to -1. Used to keep the function from iterating through all the addresses.
     :type index: int
+    :param pivot: If True and no APY offers the pair directly, the text is translated through intermediate languages (see :func:`getPivotPaths`). Only used when index is -1. Defaults to False.
+    :type pivot: boolean
+    :param deadline: Optional maximum number of seconds the whole call may take, failover to other addresses included. None (no deadline) by default.
+    :type deadline: float
+    :param priority: Either **PRIORITY_INTERACTIVE** (default) or **PRIORITY_BULK**. Bulk translations wait behind interactive ones when an APY is busy and are the first to be dropped when its queue is full.
+    :type priority: int
+    :param prefilter: If True, the text goes through :mod:`apertiumpluginutils.apertiumFilter` first: texts with nothing to translate are returned as they are without contacting any APY, and URLs, mentions and code are kept out of the translation. None (default) uses the value of **filterText**.
+    :type prefilter: boolean
+    :param segment: If True, the text is split into sentences and only those not found in the segment cache are sent to the APY, all of them in a single request. None (default) uses the value of **segmentText**.
+    :type segment: boolean
     :returns: A dictionary.
 
     	The dictionary has the following fields:
@@ -499,74 +566,813 @@ def translate(text, source, target, index=-1):
     	- **'errorMsg':** String with the cause of the error. Only present if **'ok'** is False
 
     	- **'result':** A string with the translated text. Only present if **'ok'** is True
+
+    	- **'path':** List with the languages the text went through. Only present if a pivot translation took place
     """
-	if(index > -1 and index < len(apyAddress)):
-		apyList = [apyAddress[index]]
-		last = 0
+	start = time.time()
+	text = apertiumDecoding.toText(text)
+	source = apertiumDecoding.toText(source)
+	target = apertiumDecoding.toText(target)
+	original = text
+
+	if(prefilter is None):
+		prefilter = filterText
+
+	if(prefilter):
+		prepared = apertiumFilter.prepare(text)
+
+		if(prepared is None):
+			result = apertiumResult.success(_output(text))
+			_record('translate', start, result, source, target, original)
+			return result
+		text, spans = prepared
+
+	if(segment is None):
+		segment = segmentText
+
+	if(segment):
+		result = _translateSegments(text, source, target, index, pivot, _deadlineEnd(deadline), priority)
+	else:
+		result = _translate(text, source, target, index, pivot, _deadlineEnd(deadline), priority)
+
+	if(result is None or not result['ok']):
+		_record('translate', start, result, source, target, original)
+		return result
+
+	translation = result['result']
+	if(prefilter):
+		translation = apertiumFilter.restore(translation, spans)
+
+	# The result of the request is returned as it is when there is nothing to convert
+	if('path' in result):
+		result = apertiumResult.success(_output(translation), tuple(_output(lang) for lang in result['path']))
+	elif(not textResults or translation is not result['result']):
+		result = apertiumResult.success(_output(translation))
+
+	_record('translate', start, result, source, target, original)
+
+	return result
+
+def buildPairGraph(force=False):
+	"""
+	Builds the routing index used for pivot translations out of the pairs offered by every APY in the list.
+
+    The index is cached and reused until the APY list or any of the pair catalogs change. The precomputed pivot paths are kept as long as the pairs offered do not change.
+
+    :param force: Revalidates the pair catalog of every APY before checking whether the index is still current. Defaults to False.
+    :type force: boolean
+    :returns: True if at least one APY answered with its pairs, False otherwise.
+    """
+	global pairGraph, pairGraphKey, pivotPaths
+
+	addresses = tuple(_sharedAPYs())
+
+	if(force):
+		for address in addresses:
+			_fetchCatalog(address)
+
+	key = (addresses, catalogVersion)
+
+	if(pairGraph is not None and pairGraphKey == key):
+		return True
+
+	graph = {}
+	answered = False
+
+	for address in addresses:
+		result = _fetchCatalog(address)
+
+		if(not result['ok']):
+			continue
+
+		answered = True
+		for source,target in result['result']['pairs']:
+			graph.setdefault(source, {}).setdefault(target, []).append(address)
+
+	if(graph != pairGraph):
+		pivotPaths = {}
+
+	pairGraph = graph
+	if(answered):
+		pairGraphKey = (addresses, catalogVersion)
 	else:
-		apyList = apyAddress
-		last = len(apyAddress)-1
+		pairGraphKey = None
+
+	return answered
+
+def getPivotPaths(source, target):
+	"""
+	Retrieves the shortest chains of available language pairs that lead from a source language to a target language.
+
+    :param source: String with the language to start from.
+    :type source: str
+    :param target: String with the language to arrive at.
+    :type target: str
+    :returns: A dictionary.
+
+    	The dictionary has the following fields:
+
+    	- **'ok'**: True if the call was successful, False otherwise
+
+    	- **'errorMsg':** String with the cause of the error. Only present if **'ok'** is False
+
+    	- **'result':** List with the paths, fastest first. Only present if **'ok'** is True
+
+    .. note::
+
+       Each path is a tuple of languages starting with the source and ending with the target language. A path with only those two elements means the pair is offered directly. Paths longer than :data:`maxPivotHops` pairs are not considered.
+    """
+	source = apertiumDecoding.toText(source)
+	target = apertiumDecoding.toText(target)
+
+	paths = _findPivotPaths(source, target)
+
+	if(pairGraphKey is None):
+		return _error('Error on connection')
+
+	return apertiumResult.success(tuple(tuple(_output(lang) for lang in path) for path in _sortPaths(paths)))
+
+def setWarmUpPairs(pairs):
+	"""
+	Sets the language pairs to be warmed up by :func:`warmUp`.
+
+    Once set, the pairs are also warmed up on every APY added with :func:`setAPYAddress` or :func:`setAPYList`.
+
+    :param pairs: List of pairs, each of them a list or tuple with the source and target languages, the most used first. An empty list disables the warm-up of new APYs.
+    """
+	global warmUpPairs
+
+	warmUpPairs = [(apertiumDecoding.toText(source), apertiumDecoding.toText(target)) for source,target in pairs]
+
+def warmUp(pairs=None, addresses=None, background=True):
+	"""
+	Sends a short translation for each language pair so that the APYs start their pipelines before the first real message arrives.
+
+    Each pair is only sent to the APYs offering it. When **routingMode** is *'affinity'*, it is only sent to the APY that would translate it first. The requests are sent with bulk priority.
+
+    :param pairs: List of pairs to warm up, each of them a list or tuple with the source and target languages. Defaults to the pairs set with :func:`setWarmUpPairs`.
+    :param addresses: List of APY addresses to warm up. Defaults to every address in the APY list.
+    :param background: If True (default), the requests are sent from a background thread and the function returns immediately.
+    :type background: boolean
+    :returns: None if background is True. Otherwise, the number of pairs successfully warmed up.
+    """
+	if(pairs is None):
+		pairs = warmUpPairs
+	else:
+		pairs = [(apertiumDecoding.toText(source), apertiumDecoding.toText(target)) for source,target in pairs]
+
+	if(addresses is None):
+		addresses = list(_sharedAPYs())
+	else:
+		addresses = [apertiumDecoding.toText(address) for address in addresses]
+
+	if(background):
+		thread = threading.Thread(target=_warmUp, args=(pairs, addresses))
+		thread.daemon = True
+		thread.start()
+		return None
+
+	return _warmUp(pairs, addresses)
+
+def _warmUp(pairs, addresses):
+	warmed = 0
+
+	for address in addresses:
+		result = _fetchCatalog(address, priority=PRIORITY_BULK)
+
+		if(not result['ok']):
+			continue
+
+		for source,target in pairs:
+			if((source, target) not in result['result']['pairSet']):
+				continue
+			if(routingMode == 'affinity' and address != daemonAddress and _affinityOrder(source, target)[0] != address):
+				continue
+
+			if(_requestTranslation(address, warmUpText, source, target, priority=PRIORITY_BULK)['ok']):
+				warmed = warmed+1
+
+	return warmed
+
+def _findPivotPaths(source, target):
+	buildPairGraph()
+
+	key = (source, target)
+	if(key in pivotPaths):
+		return pivotPaths[key]
+
+	paths = []
+	frontier = [[source]]
+
+	for hop in range(maxPivotHops):
+		nextFrontier = []
+
+		for path in frontier:
+			for lang in pairGraph.get(path[-1], {}):
+				if(lang in path):
+					continue
+				if(lang == target):
+					paths.append(path+[lang])
+				else:
+					nextFrontier.append(path+[lang])
+
+		if(len(paths) > 0):
+			break
+		frontier = nextFrontier
+
+	pivotPaths[key] = paths
+
+	return paths
+
+def _pathCost(path):
+	cost = 0.0
+
+	for it in range(len(path)-1):
+		cost = cost+pairLatency.get((path[it], path[it+1]), 0.0)
+
+	return cost
+
+def _sortPaths(paths):
+	return sorted(paths, key=_pathCost)
+
+def _translate(text, source, target, index, pivot, end, priority):
+	if(pivot and index == -1):
+		paths = _findPivotPaths(source, target)
+
+		if(len(paths) > 0 and len(paths[0]) > 2):
+			return _translatePivot(text, paths, end, priority)
+
+	if(routingMode == 'affinity' and index == -1 and daemonAddress is None):
+		apyList = _affinityOrder(source, target)
+	else:
+		apyList = _selectAPYs(index)
+	last = len(apyList)-1
 
 	for it,address in enumerate(apyList):
-		result = pairExists(source, target, it)
-
-		if(pyVersion >= 3):
-			try:
-				text = text.decode("utf-8")
-			except:
-				pass
-			try:
-				source = source.decode("utf-8")
-			except:
-				pass
-			try:
-				target = target.decode("utf-8")
-			except:
-				pass
+		attemptEnd = _attemptEnd(end, len(apyList)-it)
+		result = _pairExists(source, target, [address], attemptEnd, priority)
 
 		if(result['ok']):
 			if(result['result']):
+				result = _requestTranslation(address, text, source, target, attemptEnd, priority)
 
-				try:
-					request = urllib2.urlopen(address+'/translate?q='+parse.quote_plus(text)+'&langpair='+source+'|'+target, timeout=timeout)
-				except urllib2.URLError:
-					if(it == last):
-						return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-					else:
-						continue
-				except urllib2.HTTPError:
-					if(it == last):
-						return {'ok':False, 'errorMsg':'Error on connection'.encode('utf-8')}
-					else:
-						continue
-				except socket.timeout:
-					if(it == last):
-						return {'ok':False, 'errorMsg':'Request timed out'.encode('utf-8')}
-					else:
-						continue
-
-				if(request.getcode() < 300):
-					if(pyVersion >= 3):
-						request = request.read().decode("utf-8")
-						jsonObj = json.loads(request)
-					else:
-						jsonObj = json.load(request)
-
-					return {'ok':True, 'result':parser.unescape(jsonObj['responseData']['translatedText']).replace('%20',' ').encode('utf-8')}
-
+				if(result['ok'] or it == last or not _canFailOver(address, result)):
+					return result
 				else:
-					if(it == last):
-						return {'ok':False, 'errorMsg':'Response '+str(request.getcode())+' from APY'}
-					else:
-						continue
+					continue
 
 			else:
-				if(it == last):
-					return {'ok':False, 'errorMsg':('Pair '+source+'-'+target+' does not exist').encode('utf-8')}
+				if(it == last or address == daemonAddress):
+					return _error('Pair '+source+'-'+target+' does not exist')
 				else:
 					continue
 		else:
-			if(it == last):
+			if(it == last or not _canFailOver(address, result)):
 				return result
 			else:
 				continue
+
+def _translateSegments(text, source, target, index, pivot, end, priority):
+	parts = segmentPattern.split(text)
+	translations = {}
+	misses = []
+
+	with segmentLock:
+		for sentence in parts[::2]:
+			if(sentence.strip() == '' or sentence in translations):
+				continue
+
+			key = (source, target, sentence)
+			if(key in segmentCache):
+				translations[sentence] = segmentCache.pop(key)
+				segmentCache[key] = translations[sentence]
+				segmentCacheStats['hits'] = segmentCacheStats['hits']+1
+			elif(sentence not in misses):
+				misses.append(sentence)
+				segmentCacheStats['misses'] = segmentCacheStats['misses']+1
+
+	result = None
+
+	if(len(misses) > 0):
+		result = _translate('\n'.join(misses), source, target, index, pivot, end, priority)
+
+		if(result is None or not result['ok']):
+			return result
+
+		translated = result['result'].split('\n')
+
+		if(len(translated) != len(misses)):
+			translated = []
+			for sentence in misses:
+				result = _translate(sentence, source, target, index, pivot, end, priority)
+				if(not result['ok']):
+					return result
+				translated.append(result['result'])
+
+		with segmentLock:
+			for sentence,translation in zip(misses, translated):
+				translations[sentence] = translation
+				segmentCache[(source, target, sentence)] = translation
+
+			while(len(segmentCache) > segmentCacheSize):
+				segmentCache.popitem(last=False)
+
+	for it in range(0, len(parts), 2):
+		parts[it] = translations.get(parts[it], parts[it])
+
+	if(result is None or 'path' not in result):
+		return apertiumResult.success(''.join(parts))
+	else:
+		return apertiumResult.success(''.join(parts), result['path'])
+
+def _translatePivot(text, paths, end=None, priority=PRIORITY_INTERACTIVE):
+	error = None
+
+	for path in _sortPaths(paths):
+		current = text
+
+		for it in range(len(path)-1):
+			# The graph may have been rebuilt since the paths were found, leaving a hop with no APY
+			result = None
+			for address in pairGraph.get(path[it], {}).get(path[it+1], []):
+				result = _requestTranslation(address, current, path[it], path[it+1], end, priority)
+				if(result['ok']):
+					break
+
+			if(result is None or not result['ok']):
+				break
+			current = result['result']
+		else:
+			return apertiumResult.success(current, path)
+
+		if(result is not None):
+			error = result
+
+	if(error is None):
+		return _error('Pair '+paths[0][0]+'-'+paths[0][-1]+' does not exist')
+
+	return error
+
+def _requestTranslation(address, text, source, target, end=None, priority=PRIORITY_INTERACTIVE):
+	if(pyVersion < 3 and not isinstance(text, str)):
+		text = text.encode('utf-8')
+
+	path = '/translate?q='+parse.quote_plus(text)+'&langpair='+source+'|'+target
+	if(address == daemonAddress and priority == PRIORITY_BULK):
+		path = path+'&priority=bulk'
+
+	start = time.time()
+	result = _fetch(address, path, _attemptTimeout(address, end, path=path), priority, apertiumDecoding.translatedText)
+
+	if(result['ok']):
+		_recordLatency(source, target, time.time()-start)
+
+	return result
+
+def _recordLatency(source, target, elapsed):
+	key = (source, target)
+
+	if(key in pairLatency):
+		pairLatency[key] = pairLatency[key]+latencySmoothing*(elapsed-pairLatency[key])
+	else:
+		pairLatency[key] = elapsed
+
+def _record(kind, start, result, source=None, target=None, text=None):
+	if(recorder is None):
+		return
+
+	event = {'time':start, 'kind':kind, 'ok':result is not None and result['ok'], 'latency':time.time()-start}
+
+	if(source is not None):
+		event['source'] = source
+	if(target is not None):
+		event['target'] = target
+	if(text is not None):
+		event['text'] = text
+		event['length'] = len(text)
+	if(result is not None and not result['ok'] and 'errorType' in result):
+		event['errorType'] = result['errorType']
+
+	try:
+		recorder(event)
+	except Exception:
+		pass
+
+def _output(text):
+	return apertiumDecoding.toOutput(text, textResults)
+
+def _error(message, errorType=None):
+	return apertiumResult.error(_output(message), errorType)
+
+def _outputPairs(catalog, source, target):
+	key = (textResults, source, target)
+	pairs = catalog['output'].get(key)
+
+	if(pairs is None):
+		pairs = tuple((_output(pairSource), _output(pairTarget)) for pairSource,pairTarget in catalog['pairs'] if (source is None or pairSource == source) and (target is None or pairTarget == target))
+		catalog['output'][key] = pairs
+
+	return pairs
+
+def _selectAPYs(index):
+	if(index > -1 and index < len(apyAddress)):
+		return [apyAddress[index]]
+	elif(daemonAddress is None):
+		return apyAddress
+	else:
+		return [daemonAddress]+apyAddress
+
+def _canFailOver(address, result):
+	return address != daemonAddress or result['errorType'] in (ERROR_REFUSED, ERROR_CONNECTION)
+
+def _sharedAPYs():
+	if(daemonAddress is not None and apyHealth.get(daemonAddress, True)):
+		return [daemonAddress]
+	else:
+		return _selectAPYs(-1)
+
+def _affinityOrder(source, target):
+	pair = (source, target)
+	candidates = []
+	unhealthy = []
+
+	for address in apyAddress:
+		catalog = pairCatalogs.get(address)
+
+		if(catalog is not None and pair not in catalog['pairSet']):
+			continue
+		elif(apyHealth.get(address, True)):
+			candidates.append(address)
+		else:
+			unhealthy.append(address)
+
+	if(len(candidates) == 0):
+		return unhealthy if len(unhealthy) > 0 else apyAddress
+
+	# Each set of candidates keeps its own ring, so pairs offered by different APYs do not rebuild each other's
+	key = tuple(candidates)
+	ring = affinityRings.get(key)
+
+	if(ring is None):
+		ring = []
+		for address in candidates:
+			for replica in range(affinityReplicas):
+				ring.append((_ringHash(address+'#'+str(replica)), address))
+		ring.sort()
+
+		if(len(affinityRings) >= 64):
+			affinityRings.clear()
+		affinityRings[key] = ring
+
+	order = []
+	start = bisect.bisect(ring, (_ringHash(source+'|'+target),))
+
+	for it in range(len(ring)):
+		address = ring[(start+it) % len(ring)][1]
+		if(address not in order):
+			order.append(address)
+			if(len(order) == len(candidates)):
+				break
+
+	loads = [getScheduler(address).getLoad() for address in order]
+	limit = affinityLoadFactor*(sum(loads)+1)/len(order)
+
+	for it,load in enumerate(loads):
+		if(load < limit):
+			order.insert(0, order.pop(it))
+			break
+
+	return order+unhealthy
+
+def _ringHash(value):
+	return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+def _fetchRaw(address, path, headers={}, requestTimeout=None, priority=PRIORITY_INTERACTIVE):
+	if(requestTimeout is None):
+		requestTimeout = getAdaptiveTimeout(address, path)
+	if(requestTimeout <= 0):
+		return _error('Request timed out', ERROR_TIMEOUT)
+
+	scheduler = getScheduler(address)
+	start = time.time()
+	status = scheduler.acquire(priority, requestTimeout)
+
+	if(status == apertiumScheduler.SHED):
+		return _error('Too many requests queued for APY', ERROR_BUSY)
+	elif(status == apertiumScheduler.TIMEOUT):
+		return _error('Request timed out', ERROR_TIMEOUT)
+
+	remaining = requestTimeout-(time.time()-start)
+	if(remaining <= 0):
+		scheduler.release()
+		return _error('Request timed out', ERROR_TIMEOUT)
+
+	try:
+		result = _send(address, path, headers, remaining)
+	finally:
+		scheduler.release()
+
+	apyHealth[address] = result['ok'] or result['errorType'] not in (ERROR_REFUSED, ERROR_CONNECTION, ERROR_TIMEOUT)
+
+	return result
+
+def _send(address, path, headers, requestTimeout):
+	if(address.startswith('unix://')):
+		return _sendUnix(address, path, headers, requestTimeout)
+
+	request = urllib2.Request(address+path)
+	request.add_header('Accept-Encoding', 'gzip')
+	for header,value in headers.items():
+		request.add_header(header, value)
+
+	start = time.time()
+
+	try:
+		response = urllib2.urlopen(request, timeout=requestTimeout)
+		body = response.read()
+	except urllib2.HTTPError as e:
+		if(e.code == 304):
+			_recordAddressLatency(address, path, time.time()-start)
+			return {'ok':True, 'code':304, 'headers':e.info(), 'body':None}
+		return _responseError(e.code)
+	except urllib2.URLError as e:
+		return _socketError(e.reason)
+	except socket.timeout:
+		return _error('Request timed out', ERROR_TIMEOUT)
+	except socket.error as e:
+		return _socketError(e)
+	except httplib.HTTPException:
+		return _error('Error on connection', ERROR_CONNECTION)
+
+	_recordAddressLatency(address, path, time.time()-start)
+
+	if(response.info().get('Content-Encoding', '').lower() == 'gzip'):
+		try:
+			body = zlib.decompress(body, 16+zlib.MAX_WBITS)
+		except zlib.error:
+			return _error('Malformed response from APY', ERROR_MALFORMED)
+
+	return {'ok':True, 'code':response.getcode(), 'headers':response.info(), 'body':body}
+
+def _sendUnix(address, path, headers, requestTimeout):
+	headers = dict(headers)
+	headers['Accept-Encoding'] = 'gzip'
+
+	connection = _takeConnection(address)
+	reused = connection is not None
+	start = time.time()
+
+	while(True):
+		if(connection is None):
+			connection = _UnixConnection(address[len('unix://'):])
+		connection.timeout = max(requestTimeout-(time.time()-start), 0.001)
+
+		try:
+			if(connection.sock is not None):
+				connection.sock.settimeout(connection.timeout)
+			connection.request('GET', path, headers=headers)
+			response = connection.getresponse()
+			body = response.read()
+			break
+		except socket.timeout:
+			connection.close()
+			return _error('Request timed out', ERROR_TIMEOUT)
+		except (socket.error, httplib.HTTPException) as e:
+			connection.close()
+			connection = None
+
+			# The APY may have closed an idle connection, so try once more on a new one
+			if(not reused):
+				return _socketError(e)
+			reused = False
+
+	if(response.will_close):
+		connection.close()
+	else:
+		_returnConnection(address, connection)
+
+	if(response.status >= 400):
+		return _responseError(response.status)
+
+	_recordAddressLatency(address, path, time.time()-start)
+
+	if(response.status == 304):
+		return {'ok':True, 'code':304, 'headers':response.msg, 'body':None}
+
+	if(response.getheader('Content-Encoding', '').lower() == 'gzip'):
+		try:
+			body = zlib.decompress(body, 16+zlib.MAX_WBITS)
+		except zlib.error:
+			return _error('Malformed response from APY', ERROR_MALFORMED)
+
+	return {'ok':True, 'code':response.status, 'headers':response.msg, 'body':body}
+
+class _UnixConnection(httplib.HTTPConnection):
+	def __init__(self, socketPath):
+		httplib.HTTPConnection.__init__(self, 'localhost')
+		self.socketPath = socketPath
+
+	def connect(self):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.settimeout(self.timeout)
+
+		try:
+			sock.connect(self.socketPath)
+		except:
+			sock.close()
+			raise
+
+		self.sock = sock
+
+def _takeConnection(address):
+	with unixConnectionsLock:
+		idle = unixConnections.get(address)
+
+		if(idle):
+			return idle.pop()
+
+	return None
+
+def _returnConnection(address, connection):
+	with unixConnectionsLock:
+		idle = unixConnections.setdefault(address, [])
+
+		if(len(idle) < unixPoolSize):
+			idle.append(connection)
+			return
+
+	connection.close()
+
+def _responseError(code):
+	if(code >= 500):
+		return _error('Response '+str(code)+' from APY', ERROR_SERVER)
+	else:
+		return _error('Response '+str(code)+' from APY', ERROR_CLIENT)
+
+def _socketError(reason):
+	if(isinstance(reason, socket.timeout)):
+		return _error('Request timed out', ERROR_TIMEOUT)
+	elif(getattr(reason, 'errno', None) in (errno.ECONNREFUSED, errno.ENOENT)):
+		return _error('Error on connection', ERROR_REFUSED)
+	else:
+		return _error('Error on connection', ERROR_CONNECTION)
+
+def _retry(address, path, requestTimeout, attempt):
+	global retryTokens
+
+	if(requestTimeout is None):
+		requestTimeout = getAdaptiveTimeout(address, path)
+
+	end = time.time()+requestTimeout
+	tries = 0
+
+	with retryLock:
+		retryTokens = min(retryBudgetMax, retryTokens+retryBudgetRatio)
+
+	while(True):
+		result = attempt(end-time.time())
+
+		if(result['ok'] or tries >= retryAttempts or result['errorType'] not in retryOn or address == daemonAddress):
+			return result
+
+		delay = random.uniform(0, min(retryMaxBackoff, retryBackoff*(2**tries)))
+		if(time.time()+delay >= end):
+			return result
+
+		with retryLock:
+			if(retryTokens < 1):
+				return result
+			retryTokens = retryTokens-1
+
+		time.sleep(delay)
+		tries = tries+1
+
+def _fetch(address, path, requestTimeout=None, priority=PRIORITY_INTERACTIVE, extract=None):
+	def attempt(remaining):
+		result = _fetchRaw(address, path, requestTimeout=remaining, priority=priority)
+
+		if(not result['ok']):
+			return result
+		elif(result['code'] >= 300):
+			return _responseError(result['code'])
+
+		try:
+			jsonObj = apertiumDecoding.loads(result['body'])
+			if(extract is not None):
+				jsonObj = extract(jsonObj)
+		except (ValueError, KeyError, TypeError):
+			return _error('Malformed response from APY', ERROR_MALFORMED)
+
+		return apertiumResult.success(jsonObj)
+
+	return _retry(address, path, requestTimeout, attempt)
+
+def _fetchCatalog(address, requestTimeout=None, priority=PRIORITY_INTERACTIVE):
+	return _retry(address, '/listPairs', requestTimeout, lambda remaining: _fetchCatalogOnce(address, remaining, priority))
+
+def _fetchCatalogOnce(address, requestTimeout, priority):
+	global catalogVersion
+
+	catalog = pairCatalogs.get(address)
+	headers = {}
+
+	if(catalog is not None):
+		if(catalog['etag'] is not None):
+			headers['If-None-Match'] = catalog['etag']
+		if(catalog['lastModified'] is not None):
+			headers['If-Modified-Since'] = catalog['lastModified']
+
+	result = _fetchRaw(address, '/listPairs', headers, requestTimeout, priority)
+
+	if(not result['ok']):
+		return result
+	elif(result['code'] == 304 and catalog is not None):
+		return apertiumResult.success(catalog)
+	elif(result['code'] >= 300):
+		return _responseError(result['code'])
+
+	digest = hashlib.sha1(result['body']).digest()
+
+	if(catalog is None or catalog['hash'] != digest):
+		try:
+			pairs = [(pair['sourceLanguage'], pair['targetLanguage']) for pair in apertiumDecoding.loads(result['body'])['responseData']]
+		except (ValueError, KeyError, TypeError):
+			return _error('Malformed response from APY', ERROR_MALFORMED)
+
+		if(catalog is None or catalog['pairs'] != pairs):
+			catalogVersion = catalogVersion+1
+		catalog = {'pairs':pairs, 'pairSet':frozenset(pairs), 'hash':digest, 'output':{}}
+
+	catalog['etag'] = result['headers'].get('ETag')
+	catalog['lastModified'] = result['headers'].get('Last-Modified')
+	pairCatalogs[address] = catalog
+
+	return apertiumResult.success(catalog)
+
+def _catalogAny(apyList, end=None):
+	last = len(apyList)-1
+
+	for it,address in enumerate(apyList):
+		result = _fetchCatalog(address, _attemptTimeout(address, end, len(apyList)-it))
+
+		if(result['ok'] or it == last or not _canFailOver(address, result)):
+			return result
+
+def _pairExists(source, target, apyList, end=None, priority=PRIORITY_INTERACTIVE):
+	last = len(apyList)-1
+
+	for it,address in enumerate(apyList):
+		result = _fetchCatalog(address, _attemptTimeout(address, end, len(apyList)-it), priority)
+
+		if(result['ok']):
+			if((source, target) in result['result']['pairSet']):
+				return apertiumResult.TRUE_RESULT
+
+			if(it == last or address == daemonAddress):
+				return apertiumResult.FALSE_RESULT
+
+		elif(it == last or not _canFailOver(address, result)):
+			return result
+
+def _deadlineEnd(deadline):
+	if(deadline is None):
+		return None
+
+	return time.time()+deadline
+
+def _attemptEnd(end, attemptsLeft):
+	if(end is None):
+		return None
+
+	return time.time()+(end-time.time())/attemptsLeft
+
+def _attemptTimeout(address, end, attemptsLeft=1, path='/listPairs'):
+	limit = getAdaptiveTimeout(address, path)
+
+	if(end is None):
+		return limit
+
+	return min(limit, (end-time.time())/attemptsLeft)
+
+def _recordAddressLatency(address, path, elapsed):
+	key = (address, _requestKind(path))
+
+	if(key not in addressLatency):
+		addressLatency[key] = collections.deque(maxlen=latencySamples)
+
+	addressLatency[key].append(elapsed)
+
+def _requestKind(path):
+	if(not path.startswith('/translate')):
+		return 'catalog'
+
+	size = 0
+	while(len(path) >= adaptiveSizeUnit*(2**size)):
+		size = size+1
+
+	return 'translate'+str(size)
+
+def _checkInBackground(addresses):
+	thread = threading.Thread(target=checkAPYList, args=(addresses,))
+	thread.daemon = True
+	thread.start()
@@ -0,0 +1,278 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Records the traffic sent to the APYs and replays it
+
+While recording, every call to :func:`apertiumpluginutils.apertiumInterfaceAPY.translate` and to the pair query functions is written as a line of JSON to a trace file, with the following fields:
+
+- **'time'** : Timestamp of the call
+- **'kind'** : Name of the function called
+- **'source'**, **'target'** : Languages involved, when the function takes them
+- **'length'** : Length of the text to be translated
+- **'hash'** or **'text'** : Hash of the text, or the text itself if it was recorded with *keepText*
+- **'ok'** : Whether the call succeeded
+- **'errorType'** : Type of the error, if any
+- **'latency'** : Seconds the call took
+
+A trace can be replayed at its original speed or faster against any APY, including a stand-in one (see :mod:`apertiumpluginutils.apertiumStandIn`), to measure the throughput and latency it achieves::
+
+	python -m apertiumpluginutils.apertiumRecorder TRACE [-s SPEED] [-a APY]... [--stand-in]
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+from . import apertiumInterfaceAPY
+
+class Recorder(object):
+	"""
+	Writes the events received from :mod:`apertiumpluginutils.apertiumInterfaceAPY` to a trace file.
+
+    :param fileName: Name of the trace file. New events are appended to it.
+    :type fileName: str
+    :param keepText: If True, the texts to be translated are stored in the trace. Otherwise (default), only a hash of them is.
+    :type keepText: boolean
+    """
+
+	def __init__(self, fileName, keepText=False):
+		self.keepText = keepText
+		self.lock = threading.Lock()
+		self.file = open(fileName, 'a')
+
+	def __call__(self, event):
+		event = dict(event)
+		text = event.pop('text', None)
+
+		if(text is not None):
+			if(self.keepText):
+				event['text'] = text
+			else:
+				event['hash'] = hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+		line = json.dumps(event)+'\n'
+
+		with self.lock:
+			if(self.file is not None):
+				self.file.write(line)
+
+	def close(self):
+		"""
+		Closes the trace file.
+	    """
+		with self.lock:
+			if(self.file is not None):
+				self.file.close()
+				self.file = None
+
+def startRecording(fileName, keepText=False):
+	"""
+	Starts recording the calls made to :mod:`apertiumpluginutils.apertiumInterfaceAPY`.
+
+    :param fileName: Name of the trace file. New events are appended to it.
+    :type fileName: str
+    :param keepText: If True, the texts to be translated are stored in the trace. Otherwise (default), only a hash of them is.
+    :type keepText: boolean
+    :returns: The :class:`Recorder`.
+    """
+	stopRecording()
+
+	apertiumInterfaceAPY.recorder = Recorder(fileName, keepText)
+
+	return apertiumInterfaceAPY.recorder
+
+def stopRecording():
+	"""
+	Stops the recording started with :func:`startRecording`, if any.
+    """
+	recorder = apertiumInterfaceAPY.recorder
+	apertiumInterfaceAPY.recorder = None
+
+	if(recorder is not None and hasattr(recorder, 'close')):
+		recorder.close()
+
+def loadTrace(fileName):
+	"""
+	Reads a trace file.
+
+    :param fileName: Name of the trace file.
+    :type fileName: str
+    :returns: The list of events, sorted by time.
+    """
+	events = []
+
+	with open(fileName, 'r') as file1:
+		for line in file1:
+			if(line.strip() != ''):
+				events.append(json.loads(line))
+
+	events.sort(key=lambda event: event['time'])
+
+	return events
+
+def replay(events, speed=1.0, workers=32):
+	"""
+	Sends the calls in a trace again, keeping the original time between them divided by *speed*.
+
+    Translations whose text was not stored are replayed with a text of the same length. The calls are sent to the current APY list of :mod:`apertiumpluginutils.apertiumInterfaceAPY`.
+
+    :param events: List of events, as returned by :func:`loadTrace`.
+    :param speed: How many times faster than the original the trace is replayed. Defaults to 1.
+    :type speed: float
+    :param workers: Maximum number of calls in progress at the same time. Defaults to 32.
+    :type workers: int
+    :returns: A dictionary.
+
+    	The dictionary has the following fields:
+
+    	- **'calls'**: Number of calls replayed
+
+    	- **'errors'**: Number of calls that failed
+
+    	- **'errorRate'**: Fraction of the calls that failed
+
+    	- **'errorTypes'**: Dictionary with the number of errors of each type
+
+    	- **'duration'**: Seconds taken by the replay
+
+    	- **'throughput'**: Calls completed per second
+
+    	- **'latency'**: Dictionary with the **'p50'**, **'p90'**, **'p99'** and **'max'** latencies, in seconds
+
+    	- **'lag'**: Largest delay, in seconds, between the time a call should have been sent and the time it was sent
+    """
+	pending = queue.Queue(workers)
+	latencies = []
+	errorTypes = {}
+	lock = threading.Lock()
+	state = {'errors':0, 'lag':0.0}
+
+	def work():
+		while(True):
+			event = pending.get()
+			if(event is None):
+				return
+
+			start = time.time()
+			result = _call(event)
+			elapsed = time.time()-start
+
+			with lock:
+				latencies.append(elapsed)
+				if(result is None or not result['ok']):
+					state['errors'] = state['errors']+1
+					errorType = 'unknown' if result is None else result.get('errorType', 'other')
+					errorTypes[errorType] = errorTypes.get(errorType, 0)+1
+
+	threads = [threading.Thread(target=work) for it in range(workers)]
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+
+	start = time.time()
+	first = events[0]['time'] if len(events) > 0 else 0
+
+	for event in events:
+		due = start+(event['time']-first)/speed
+		now = time.time()
+
+		if(due > now):
+			time.sleep(due-now)
+		else:
+			state['lag'] = max(state['lag'], now-due)
+
+		pending.put(event)
+
+	for thread in threads:
+		pending.put(None)
+	for thread in threads:
+		thread.join()
+
+	duration = max(time.time()-start, 1e-6)
+	latencies.sort()
+
+	return {'calls':len(latencies), 'errors':state['errors'], 'errorRate':float(state['errors'])/max(len(latencies), 1), 'errorTypes':errorTypes, 'duration':duration, 'throughput':len(latencies)/duration, 'latency':{'p50':_percentile(latencies, 0.5), 'p90':_percentile(latencies, 0.9), 'p99':_percentile(latencies, 0.99), 'max':_percentile(latencies, 1.0)}, 'lag':state['lag']}
+
+def main(argv=None):
+	"""
+	Replays a trace from the command line and prints the results.
+
+    :param argv: List with the arguments. Defaults to the ones given to the program.
+    """
+	parser = argparse.ArgumentParser(prog='python -m apertiumpluginutils.apertiumRecorder', description='Replays a trace recorded with apertiumRecorder against an APY.')
+	parser.add_argument('trace', help='trace file to replay')
+	parser.add_argument('-s', '--speed', type=float, default=1.0, help='how many times faster than recorded to replay it (default: 1)')
+	parser.add_argument('-a', '--apy', action='append', help='address of an APY to use; can be given several times')
+	parser.add_argument('-w', '--workers', type=int, default=32, help='maximum number of calls in progress (default: 32)')
+	parser.add_argument('--stand-in', action='store_true', help='replay against a local stand-in APY offering the pairs successfully used in the trace')
+	args = parser.parse_args(argv)
+
+	events = loadTrace(args.trace)
+	apertiumInterfaceAPY.maxConcurrentRequests = max(apertiumInterfaceAPY.maxConcurrentRequests, args.workers)
+
+	if(args.stand_in):
+		from . import apertiumStandIn
+
+		pairs = set((event['source'], event['target']) for event in events if 'source' in event and 'target' in event and event['ok'])
+		server = apertiumStandIn.serve(port=0, pairs=pairs)
+		apertiumInterfaceAPY.setAPYList(['http://%s:%d' % server.server_address])
+	elif(args.apy):
+		apertiumInterfaceAPY.setAPYList(args.apy)
+
+	report = replay(events, args.speed, args.workers)
+
+	sys.stdout.write('calls       %d\n' % report['calls'])
+	sys.stdout.write('duration    %.2f s\n' % report['duration'])
+	sys.stdout.write('throughput  %.1f calls/s\n' % report['throughput'])
+	sys.stdout.write('latency     p50 %.1f ms  p90 %.1f ms  p99 %.1f ms  max %.1f ms\n' % tuple(report['latency'][key]*1000 for key in ['p50', 'p90', 'p99', 'max']))
+	sys.stdout.write('errors      %d (%.2f%%) %s\n' % (report['errors'], report['errorRate']*100, json.dumps(report['errorTypes'])))
+	sys.stdout.write('max lag     %.1f ms\n' % (report['lag']*1000))
+
+def _call(event):
+	kind = event['kind']
+
+	if(kind == 'translate'):
+		text = event.get('text', ('a '*(event.get('length', 1)//2+1))[:max(event.get('length', 1), 1)])
+		return apertiumInterfaceAPY.translate(text, event['source'], event['target'])
+	elif(kind == 'pairExists'):
+		return apertiumInterfaceAPY.pairExists(event['source'], event['target'])
+	elif(kind == 'getPairsBySource'):
+		return apertiumInterfaceAPY.getPairsBySource(event['source'])
+	elif(kind == 'getPairsByTarget'):
+		return apertiumInterfaceAPY.getPairsByTarget(event['target'])
+	else:
+		return apertiumInterfaceAPY.getAllPairs()
+
+def _percentile(values, fraction):
+	if(len(values) == 0):
+		return 0.0
+
+	return values[min(len(values)-1, int(fraction*len(values)))]
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,108 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Result objects returned by the interface functions
+
+A :class:`Result` is a dictionary that cannot be modified, with the same fields the interface functions always returned (*result['ok']*, *'errorMsg' in result*...). They can also be read as attributes (*result.ok*). Since results cannot be modified, the same object can be handed to every caller; errors are only built once (see :func:`error`).
+"""
+
+def _immutable(self, *args, **kwargs):
+	raise TypeError('Result objects cannot be modified')
+
+def _field(name):
+	return property(lambda self: dict.get(self, name))
+
+class Result(dict):
+	"""
+	Outcome of a call to an interface function, as a read-only dictionary. Use :func:`success` and :func:`error` to build them.
+
+	The dictionary has the following fields:
+
+	- **'ok'**: True if the call was successful, False otherwise
+
+	- **'result'**: Value returned by the call. Only present if **'ok'** is True
+
+	- **'errorMsg'**: String with the cause of the error. Only present if **'ok'** is False
+
+	- **'errorType'**: Type of the error, if known. Only present if **'ok'** is False
+
+	- **'path'**: List of languages a pivot translation went through, if any
+
+	Each field can also be read as an attribute, which is None when the field is not present. *copy()* returns a regular dictionary that can be modified.
+	"""
+
+	__slots__ = ()
+
+	__setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _immutable
+
+	ok = _field('ok')
+
+	result = _field('result')
+
+	errorMsg = _field('errorMsg')
+
+	errorType = _field('errorType')
+
+	path = _field('path')
+
+	def __reduce__(self):
+		return (Result, (dict(self),))
+
+errors = {}
+
+def success(result, path=None):
+	"""
+	Builds a successful result.
+
+    :param result: Value returned by the call.
+    :param path: List of languages a pivot translation went through, if any.
+    :returns: The :class:`Result`.
+    """
+	if(path is None):
+		return Result(ok=True, result=result)
+	else:
+		return Result(ok=True, result=result, path=path)
+
+def error(errorMsg, errorType=None):
+	"""
+	Retrieves the result for an error. Results for the same error are only built once and shared.
+
+    :param errorMsg: String with the cause of the error.
+    :param errorType: Type of the error, if known.
+    :returns: The :class:`Result`.
+    """
+	key = (errorMsg, errorType)
+	result = errors.get(key)
+
+	if(result is None):
+		if(len(errors) >= 1024):
+			errors.clear()
+
+		if(errorType is None):
+			result = Result(ok=False, errorMsg=errorMsg)
+		else:
+			result = Result(ok=False, errorMsg=errorMsg, errorType=errorType)
+		errors[key] = result
+
+	return result
+
+TRUE_RESULT = Result(ok=True, result=True)
+
+FALSE_RESULT = Result(ok=True, result=False)
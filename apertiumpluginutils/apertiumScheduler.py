@@ -0,0 +1,163 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Admission control for the requests sent to an Apertium-APY
+
+Each APY gets its own :class:`AddressScheduler`, which limits how many requests are sent to it at the same time and, optionally, how many are sent per second. Requests that cannot be sent right away wait in a queue ordered by priority, so interactive translations overtake bulk ones. When the queue is full, the newest request with the lowest priority is dropped.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+PRIORITY_INTERACTIVE = 0
+
+PRIORITY_BULK = 1
+
+ACQUIRED = 0
+
+SHED = 1
+
+TIMEOUT = 2
+
+class AddressScheduler(object):
+	"""
+	Decides when a request can be sent to an APY.
+
+    :param maxConcurrent: Maximum number of requests sent to the APY at the same time.
+    :type maxConcurrent: int
+    :param rate: Maximum number of requests sent per second, or None for no limit.
+    :type rate: float
+    :param burst: Number of requests that can be sent at once before *rate* applies.
+    :type burst: int
+    :param maxQueued: Maximum number of requests waiting to be sent.
+    :type maxQueued: int
+    """
+
+	def __init__(self, maxConcurrent, rate=None, burst=1, maxQueued=32):
+		self.maxConcurrent = maxConcurrent
+		self.rate = rate
+		self.burst = burst
+		self.maxQueued = maxQueued
+		self.inflight = 0
+		self.tokens = float(burst)
+		self.stamp = time.time()
+		self.waiting = []
+		self.counter = itertools.count()
+		self.condition = threading.Condition()
+
+	def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+		"""
+		Waits until a request can be sent.
+
+	    :param priority: Priority of the request. Lower values are served first.
+	    :type priority: int
+	    :param timeout: Maximum number of seconds to wait, or None to wait indefinitely.
+	    :type timeout: float
+	    :returns: :data:`ACQUIRED` if the request can be sent, :data:`SHED` if it was dropped because the queue was full, or :data:`TIMEOUT` if it waited for too long.
+
+	    .. note::
+
+	       Every :data:`ACQUIRED` result must be followed by a call to :meth:`release` once the request has finished.
+	    """
+		end = None if timeout is None else time.time()+timeout
+
+		with self.condition:
+			if(len(self.waiting) == 0 and self._ready()):
+				self._take()
+				return ACQUIRED
+
+			if(len(self.waiting) >= self.maxQueued):
+				victim = max(self.waiting)
+
+				if(victim[0] <= priority):
+					return SHED
+
+				self.waiting.remove(victim)
+				heapq.heapify(self.waiting)
+				victim[2] = SHED
+				self.condition.notify_all()
+
+			entry = [priority, next(self.counter), ACQUIRED]
+			heapq.heappush(self.waiting, entry)
+
+			while(True):
+				if(entry[2] == SHED):
+					return SHED
+
+				if(self.waiting[0] is entry and self._ready()):
+					heapq.heappop(self.waiting)
+					self._take()
+					self.condition.notify_all()
+					return ACQUIRED
+
+				wait = None
+				if(self.inflight < self.maxConcurrent and self.rate is not None):
+					wait = (1-self.tokens)/self.rate
+
+				if(end is not None):
+					remaining = end-time.time()
+
+					if(remaining <= 0):
+						self.waiting.remove(entry)
+						heapq.heapify(self.waiting)
+						self.condition.notify_all()
+						return TIMEOUT
+
+					wait = remaining if wait is None else min(wait, remaining)
+
+				self.condition.wait(wait)
+
+	def release(self):
+		"""
+		Signals that a request allowed by :meth:`acquire` has finished.
+	    """
+		with self.condition:
+			self.inflight = self.inflight-1
+			self.condition.notify_all()
+
+	def getLoad(self):
+		"""
+		Retrieves how busy the APY is.
+
+	    :returns: The number of requests being sent plus the number of requests waiting.
+	    """
+		return self.inflight+len(self.waiting)
+
+	def _ready(self):
+		if(self.inflight >= self.maxConcurrent):
+			return False
+
+		if(self.rate is not None):
+			now = time.time()
+			self.tokens = min(float(self.burst), self.tokens+(now-self.stamp)*self.rate)
+			self.stamp = now
+
+			if(self.tokens < 1):
+				return False
+
+		return True
+
+	def _take(self):
+		self.inflight = self.inflight+1
+
+		if(self.rate is not None):
+			self.tokens = self.tokens-1
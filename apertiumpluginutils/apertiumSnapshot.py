@@ -0,0 +1,382 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Binary snapshot format for the preferences dictionary
+
+A snapshot starts with **MAGIC**, followed by the format version and the schema version of the dictionary it holds, and then by a sequence of sections. Each section is made of a 4 byte tag, its length and its contents:
+
+- **STRS** : Table with the strings shared by the rest of the sections (languages, keys...), which refer to them by position.
+
+- **BIND** : Bindings of one direction (*'incoming'* or *'outgoing'*), stored by columns: the distinct language pairs, the position of the pair of each user and the names of the users.
+
+- **VALS** : The rest of the keys of the dictionary. Their values can be made of None, booleans, integers, floats, strings, bytes, lists, tuples and dictionaries.
+
+Loading a snapshot never runs any code from the file, and sections unknown to the reader are skipped.
+
+Dictionaries read from files of an older schema, including the pickle files written by previous versions of :mod:`apertiumpluginutils.apertiumFiles` (schema 0), are brought up to date by the functions in **migrations**.
+"""
+
+import array
+import codecs
+import pickle
+import struct
+import sys
+
+try:
+	from io import BytesIO
+except ImportError:
+	from StringIO import StringIO as BytesIO
+
+MAGIC = b'APSNAP'
+
+FORMAT_VERSION = 1
+
+SCHEMA_VERSION = 1
+
+textType = type(u'')
+
+try:
+	integerTypes = (int, long)
+except NameError:
+	integerTypes = (int,)
+
+arrayType = 'I' if array.array('I').itemsize == 4 else 'L'
+
+def _migrateFromPickle(dictionary):
+	for key in ['incoming', 'outgoing']:
+		if(key not in dictionary):
+			dictionary[key] = {}
+
+	if('apyAddress' not in dictionary):
+		dictionary['apyAddress'] = ['http://localhost:2737'.encode('utf-8')]
+
+	return dictionary
+
+migrations = [_migrateFromPickle]
+
+def dumps(dictionary):
+	"""
+	Builds the snapshot of a dictionary.
+
+    :param dictionary: The preferences dictionary.
+    :returns: The snapshot, as bytes.
+    :raises TypeError: If the dictionary holds a value that cannot be stored.
+    """
+	strings = _StringTable()
+	sections = []
+	rest = {}
+
+	for key,value in dictionary.items():
+		if(key in (u'incoming', u'outgoing') and type(key) is textType and _isColumnar(value)):
+			sections.append((b'BIND', _packBindings(key, value, strings)))
+		else:
+			rest[key] = value
+
+	values = []
+	_packValue(rest, values, strings)
+	sections.append((b'VALS', b''.join(values)))
+	sections.insert(0, (b'STRS', _packStrings(strings.strings)))
+
+	return MAGIC+struct.pack('<HH', FORMAT_VERSION, SCHEMA_VERSION)+b''.join([struct.pack('<4sI', tag, len(payload))+payload for tag,payload in sections])
+
+def loads(data):
+	"""
+	Reads a dictionary from its snapshot, migrating it to the current schema if needed.
+
+    :param data: The snapshot, as bytes.
+    :returns: The dictionary.
+    :raises ValueError: If the data is not a valid snapshot, or it was written by a newer version of the format.
+    """
+	if(not isSnapshot(data)):
+		raise ValueError('Not a snapshot')
+
+	strings = []
+	dictionary = {}
+
+	try:
+		pos = len(MAGIC)
+		formatVersion, schemaVersion = struct.unpack_from('<HH', data, pos)
+		pos = pos+4
+
+		if(formatVersion > FORMAT_VERSION or schemaVersion > SCHEMA_VERSION):
+			raise ValueError('Snapshot written by a newer version')
+
+		while(pos < len(data)):
+			tag, length = struct.unpack_from('<4sI', data, pos)
+			pos = pos+8
+			payload = data[pos:pos+length]
+			pos = pos+length
+
+			if(len(payload) != length):
+				raise ValueError('Truncated snapshot')
+
+			if(tag == b'STRS'):
+				strings = _unpackStrings(payload, 0)[0]
+			elif(tag == b'BIND'):
+				direction, bindings = _unpackBindings(payload, strings)
+				dictionary[direction] = bindings
+			elif(tag == b'VALS'):
+				dictionary.update(_unpackValue(payload, 0, strings)[0])
+	except (struct.error, IndexError, KeyError, TypeError, RuntimeError):
+		raise ValueError('Malformed snapshot')
+
+	return migrate(dictionary, schemaVersion)
+
+def isSnapshot(data):
+	"""
+	Tells whether some data is a snapshot.
+
+    :param data: The data, as bytes. Only the first bytes are needed.
+    :returns: True if the data starts like a snapshot, False otherwise.
+    """
+	return data[:len(MAGIC)] == MAGIC
+
+def migrate(dictionary, schemaVersion):
+	"""
+	Brings a dictionary up to the current schema.
+
+    :param dictionary: The dictionary.
+    :param schemaVersion: Schema version the dictionary was written with.
+    :type schemaVersion: int
+    :returns: The migrated dictionary.
+    """
+	for migration in migrations[schemaVersion:SCHEMA_VERSION]:
+		dictionary = migration(dictionary)
+
+	return dictionary
+
+def loadPickle(data):
+	"""
+	Reads a dictionary from a pickle file written by a previous version, refusing to create any object other than the basic types, and migrates it to the current schema.
+
+    :param data: Contents of the pickle file, as bytes.
+    :returns: The dictionary.
+    :raises ValueError: If the data is not a valid pickle of a dictionary.
+    """
+	try:
+		dictionary = _SafeUnpickler(BytesIO(data)).load()
+	except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, KeyError):
+		raise ValueError('Malformed pickle file')
+
+	if(not isinstance(dictionary, dict)):
+		raise ValueError('Malformed pickle file')
+
+	return migrate(dictionary, 0)
+
+class _StringTable(object):
+	def __init__(self):
+		self.strings = []
+		self.positions = {}
+
+	def add(self, string):
+		position = self.positions.get(string)
+
+		if(position is None):
+			position = len(self.strings)
+			self.positions[string] = position
+			self.strings.append(string)
+
+		return position
+
+class _SafeUnpickler(pickle.Unpickler):
+	def find_class(self, module, name):
+		# Protocol 2 pickles made by Python 3 rebuild bytes objects with _codecs.encode
+		if(module == '_codecs' and name == 'encode'):
+			return codecs.encode
+
+		raise pickle.UnpicklingError('Global '+module+'.'+name+' is not allowed')
+
+def _isColumnar(bindings):
+	if(not isinstance(bindings, dict)):
+		return False
+
+	for user,binding in bindings.items():
+		if(type(user) is not textType or type(binding) is not dict or len(binding) != 2 or type(binding.get('source')) is not textType or type(binding.get('target')) is not textType):
+			return False
+
+	return True
+
+def _packBindings(direction, bindings, strings):
+	users = list(bindings)
+	pairs = {}
+	ids = array.array(arrayType)
+
+	for user in users:
+		binding = bindings[user]
+		pair = (binding['source'], binding['target'])
+		position = pairs.get(pair)
+
+		if(position is None):
+			position = len(pairs)
+			pairs[pair] = position
+		ids.append(position)
+
+	table = array.array(arrayType)
+	for source,target in sorted(pairs, key=pairs.get):
+		table.append(strings.add(source))
+		table.append(strings.add(target))
+
+	return struct.pack('<III', strings.add(direction), len(users), len(pairs))+_arrayBytes(table)+_arrayBytes(ids)+_packStrings(users)
+
+def _unpackBindings(payload, strings):
+	direction, count, pairCount = struct.unpack_from('<III', payload, 0)
+	pos = 12
+	table = _unpackArray(payload, pos, 2*pairCount)
+	pos = pos+8*pairCount
+	ids = _unpackArray(payload, pos, count)
+	pos = pos+4*count
+	users, pos = _unpackStrings(payload, pos)
+
+	if(len(users) != count):
+		raise ValueError('Malformed snapshot')
+
+	bindings = [{'source':strings[table[2*it]], 'target':strings[table[2*it+1]]} for it in range(pairCount)]
+
+	# Every user gets its own copy, so bindings can still be modified in place
+	return strings[direction], dict(zip(users, map(dict.copy, map(bindings.__getitem__, ids))))
+
+def _packStrings(strings):
+	text = u'\x00'.join(strings)
+
+	if(text.count(u'\x00') == max(len(strings)-1, 0)):
+		data = text.encode('utf-8')
+		return struct.pack('<BII', 0, len(strings), len(data))+data
+
+	data = u''.join(strings).encode('utf-8')
+
+	return struct.pack('<BII', 1, len(strings), len(data))+_arrayBytes(array.array(arrayType, [len(string) for string in strings]))+data
+
+def _unpackStrings(payload, pos):
+	separated, count, length = struct.unpack_from('<BII', payload, pos)
+	pos = pos+9
+
+	if(separated == 0):
+		text = payload[pos:pos+length].decode('utf-8')
+		strings = text.split(u'\x00') if count > 0 else []
+	else:
+		lengths = _unpackArray(payload, pos, count)
+		pos = pos+4*count
+		text = payload[pos:pos+length].decode('utf-8')
+		strings = []
+		start = 0
+		for size in lengths:
+			strings.append(text[start:start+size])
+			start = start+size
+
+	if(len(strings) != count or len(payload) < pos+length):
+		raise ValueError('Malformed snapshot')
+
+	return strings, pos+length
+
+def _packValue(value, out, strings):
+	if(value is None):
+		out.append(b'N')
+	elif(value is True):
+		out.append(b'T')
+	elif(value is False):
+		out.append(b'F')
+	elif(isinstance(value, integerTypes)):
+		try:
+			out.append(b'i'+struct.pack('<q', value))
+		except struct.error:
+			raise TypeError('Integer '+str(value)+' is too large to be stored')
+	elif(isinstance(value, float)):
+		out.append(b'f'+struct.pack('<d', value))
+	elif(isinstance(value, textType)):
+		out.append(b's'+struct.pack('<I', strings.add(value)))
+	elif(isinstance(value, bytes)):
+		out.append(b'b'+struct.pack('<I', len(value))+value)
+	elif(isinstance(value, (list, tuple))):
+		out.append((b'l' if isinstance(value, list) else b't')+struct.pack('<I', len(value)))
+		for item in value:
+			_packValue(item, out, strings)
+	elif(isinstance(value, dict)):
+		out.append(b'd'+struct.pack('<I', len(value)))
+		for key,item in value.items():
+			_packValue(key, out, strings)
+			_packValue(item, out, strings)
+	else:
+		raise TypeError('Values of type '+type(value).__name__+' cannot be stored')
+
+def _unpackValue(payload, pos, strings):
+	tag = payload[pos:pos+1]
+	pos = pos+1
+
+	if(tag == b'N'):
+		return None, pos
+	elif(tag == b'T'):
+		return True, pos
+	elif(tag == b'F'):
+		return False, pos
+	elif(tag == b'i'):
+		return struct.unpack_from('<q', payload, pos)[0], pos+8
+	elif(tag == b'f'):
+		return struct.unpack_from('<d', payload, pos)[0], pos+8
+	elif(tag == b's'):
+		return strings[struct.unpack_from('<I', payload, pos)[0]], pos+4
+	elif(tag == b'b'):
+		length = struct.unpack_from('<I', payload, pos)[0]
+		pos = pos+4
+		if(len(payload) < pos+length):
+			raise ValueError('Malformed snapshot')
+		return payload[pos:pos+length], pos+length
+	elif(tag in (b'l', b't')):
+		count = struct.unpack_from('<I', payload, pos)[0]
+		pos = pos+4
+		items = []
+		for it in range(count):
+			item, pos = _unpackValue(payload, pos, strings)
+			items.append(item)
+		return (items if tag == b'l' else tuple(items)), pos
+	elif(tag == b'd'):
+		count = struct.unpack_from('<I', payload, pos)[0]
+		pos = pos+4
+		items = {}
+		for it in range(count):
+			key, pos = _unpackValue(payload, pos, strings)
+			item, pos = _unpackValue(payload, pos, strings)
+			items[key] = item
+		return items, pos
+	else:
+		raise ValueError('Malformed snapshot')
+
+def _arrayBytes(values):
+	if(sys.byteorder == 'big'):
+		values = array.array(arrayType, values)
+		values.byteswap()
+
+	return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+def _unpackArray(payload, pos, count):
+	values = array.array(arrayType)
+	data = payload[pos:pos+4*count]
+
+	if(len(data) != 4*count):
+		raise ValueError('Malformed snapshot')
+
+	if(hasattr(values, 'frombytes')):
+		values.frombytes(data)
+	else:
+		values.fromstring(data)
+
+	if(sys.byteorder == 'big'):
+		values.byteswap()
+
+	return values
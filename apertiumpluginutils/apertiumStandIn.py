@@ -0,0 +1,207 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+:Synopsis: Local stand-in for an Apertium-APY
+
+A small HTTP server answering */listPairs* and */translate* like an APY would, without doing any real translation: the translated text is the original one prefixed by the language pair. It is meant to try plugins and to load-test this module without a real APY.
+
+It can also be run from the command line::
+
+	python -m apertiumpluginutils.apertiumStandIn [-p PORT | -u SOCKET] [-d DELAY] [PAIR]...
+"""
+
+import argparse
+import json
+import os
+import stat
+import threading
+import time
+
+try:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn, UnixStreamServer
+	from urllib.parse import urlparse, parse_qs
+except ImportError:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn, UnixStreamServer
+	from urlparse import urlparse, parse_qs
+
+class StandInHandler(BaseHTTPRequestHandler):
+	"""
+	Answers the requests made to a :class:`StandInServer`.
+    """
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		query = parse_qs(url.query)
+		server = self.server
+
+		if(server.delay > 0):
+			time.sleep(server.delay)
+
+		if(url.path == '/listPairs'):
+			body = {'responseData':[{'sourceLanguage':source, 'targetLanguage':target} for source,target in server.pairs], 'responseDetails':None, 'responseStatus':200}
+		elif(url.path == '/translate' and 'langpair' in query):
+			pair = tuple(query['langpair'][0].split('|'))
+			if(pair not in server.pairs):
+				self._send(400, {'responseData':None, 'responseDetails':'That pair is not installed', 'responseStatus':400})
+				return
+			text = query.get('q', [''])[0]
+			body = {'responseData':{'translatedText':'['+pair[0]+'-'+pair[1]+'] '+text}, 'responseDetails':None, 'responseStatus':200}
+		else:
+			self._send(404, {'responseData':None, 'responseDetails':'Not found', 'responseStatus':404})
+			return
+
+		self._send(200, body)
+
+	def log_message(self, format, *args):
+		if(self.server.verbose):
+			BaseHTTPRequestHandler.log_message(self, format, *args)
+
+	def address_string(self):
+		if(not self.client_address):
+			return 'unix'
+
+		return BaseHTTPRequestHandler.address_string(self)
+
+	def _send(self, code, body):
+		data = json.dumps(body).encode('utf-8')
+
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json; charset=UTF-8')
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+	"""
+	HTTP server behaving like an APY.
+
+    :param address: Tuple with the host and port to listen on.
+    :param pairs: List of the language pairs offered, each of them a tuple with the source and target languages.
+    :param delay: Seconds to wait before answering each request.
+    :type delay: float
+    :param verbose: If True, every request is logged to the standard error.
+    :type verbose: boolean
+    """
+
+	daemon_threads = True
+	request_queue_size = 128
+
+	def __init__(self, address, pairs, delay=0, verbose=False):
+		HTTPServer.__init__(self, address, StandInHandler)
+		self.pairs = [tuple(pair) for pair in pairs]
+		self.delay = delay
+		self.verbose = verbose
+
+class UnixStandInServer(ThreadingMixIn, UnixStreamServer):
+	"""
+	HTTP server behaving like an APY, listening on a Unix domain socket.
+
+    :param path: Path of the socket. A socket left behind at that path by a previous server is replaced.
+    :type path: str
+    :param pairs: List of the language pairs offered, each of them a tuple with the source and target languages.
+    :param delay: Seconds to wait before answering each request.
+    :type delay: float
+    :param verbose: If True, every request is logged to the standard error.
+    :type verbose: boolean
+    """
+
+	daemon_threads = True
+	request_queue_size = 128
+
+	def __init__(self, path, pairs, delay=0, verbose=False):
+		if(os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode)):
+			os.remove(path)
+
+		UnixStreamServer.__init__(self, path, StandInHandler)
+		self.pairs = [tuple(pair) for pair in pairs]
+		self.delay = delay
+		self.verbose = verbose
+
+	def server_close(self):
+		UnixStreamServer.server_close(self)
+
+		if(os.path.exists(self.server_address)):
+			os.remove(self.server_address)
+
+def serve(host='127.0.0.1', port=2737, pairs=[('en', 'es'), ('es', 'en')], delay=0, background=True, path=None):
+	"""
+	Starts a stand-in APY.
+
+    :param host: Host to listen on. Defaults to '127.0.0.1'.
+    :type host: str
+    :param port: Port to listen on. Defaults to 2737, 0 picks a free one.
+    :type port: int
+    :param pairs: List of the language pairs offered, each of them a tuple with the source and target languages.
+    :param delay: Seconds to wait before answering each request. Defaults to 0.
+    :type delay: float
+    :param background: If True (default), the server runs in a background thread and the function returns immediately. Otherwise, it runs until interrupted.
+    :type background: boolean
+    :param path: If given, path of a Unix domain socket to listen on instead of host and port.
+    :type path: str
+    :returns: The :class:`StandInServer`, or the :class:`UnixStandInServer` if path was given. Its address is *'http://%s:%d' % server.server_address*, or *'unix://'+server.server_address* respectively. Call its *shutdown* method to stop it.
+    """
+	if(path is None):
+		server = StandInServer((host, port), pairs, delay)
+	else:
+		server = UnixStandInServer(path, pairs, delay)
+
+	if(background):
+		thread = threading.Thread(target=server.serve_forever)
+		thread.daemon = True
+		thread.start()
+	else:
+		server.serve_forever()
+
+	return server
+
+def main(argv=None):
+	"""
+	Runs a stand-in APY from the command line.
+
+    :param argv: List with the arguments. Defaults to the ones given to the program.
+    """
+	parser = argparse.ArgumentParser(prog='python -m apertiumpluginutils.apertiumStandIn', description='Runs a fake APY that answers with the original text.')
+	parser.add_argument('pairs', nargs='*', default=['en-es', 'es-en'], help='language pairs offered, as SOURCE-TARGET (default: en-es es-en)')
+	parser.add_argument('--host', default='127.0.0.1', help='host to listen on (default: 127.0.0.1)')
+	parser.add_argument('-p', '--port', type=int, default=2737, help='port to listen on (default: 2737)')
+	parser.add_argument('-u', '--unix', metavar='SOCKET', help='path of a Unix domain socket to listen on instead of a port')
+	parser.add_argument('-d', '--delay', type=float, default=0, help='seconds to wait before answering each request (default: 0)')
+	args = parser.parse_args(argv)
+
+	pairs = [pair.split('-', 1) for pair in args.pairs]
+
+	if(args.unix is None):
+		server = StandInServer((args.host, args.port), pairs, args.delay, verbose=True)
+	else:
+		server = UnixStandInServer(args.unix, pairs, args.delay, verbose=True)
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+if __name__ == '__main__':
+	main()
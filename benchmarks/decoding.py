@@ -0,0 +1,68 @@
+#
+# Apertium Plugin Utils.
+#
+# Copyright (C) 2014 Sergio Balbuena <sbalbp@gmail.com>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Microbenchmark comparing the old response decoding steps with :mod:`apertiumpluginutils.apertiumDecoding`.
+
+Run from the repository root with
+
+	python benchmarks/decoding.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from apertiumpluginutils import apertiumDecoding
+
+try:
+	from html import unescape
+except ImportError:
+	import HTMLParser
+	unescape = HTMLParser.HTMLParser().unescape
+
+text = u'Kaixo, zer moduz? &quot;Ongi&quot; eta zu? ñ ' * 20
+translation = json.dumps({'responseData':{'translatedText':text}, 'responseDetails':None, 'responseStatus':200}).encode('utf-8')
+pairs = json.dumps({'responseData':[{'sourceLanguage':'l%d' % it, 'targetLanguage':'l%d' % (it+1)} for it in range(500)], 'responseStatus':200}).encode('utf-8')
+
+def oldTranslation():
+	jsonObj = json.loads(translation.decode('utf-8'))
+	return unescape(jsonObj['responseData']['translatedText']).replace('%20',' ').encode('utf-8')
+
+def newTranslation():
+	return apertiumDecoding.translatedText(apertiumDecoding.loads(translation))
+
+def oldPairs():
+	jsonObj = json.loads(pairs.decode('utf-8'))
+	return [[pair['sourceLanguage'].encode('utf-8'), pair['targetLanguage'].encode('utf-8')] for pair in jsonObj['responseData']]
+
+def newPairs():
+	jsonObj = apertiumDecoding.loads(pairs)
+	return [[pair['sourceLanguage'], pair['targetLanguage']] for pair in jsonObj['responseData']]
+
+if __name__ == '__main__':
+	print('JSON backend: '+apertiumDecoding.jsonBackend)
+
+	for name,old,new,number in [('translate', oldTranslation, newTranslation, 20000), ('listPairs', oldPairs, newPairs, 500)]:
+		oldTime = min(timeit.repeat(old, number=number, repeat=5))
+		newTime = min(timeit.repeat(new, number=number, repeat=5))
+		print('%-10s old %8.2f us  new %8.2f us  (x%.2f)' % (name, oldTime/number*1e6, newTime/number*1e6, oldTime/newTime))